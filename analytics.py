@@ -0,0 +1,157 @@
+import argparse
+import json
+import sys
+import typing
+
+import numpy as np
+
+import keylog
+import session
+
+
+"""
+Session analytics
+
+Loads keystroke logs written by keylog.KeyLog straight into NumPy arrays and
+computes per-session statistics with array operations only, no per-key
+Python loops:
+
+    rolling WPM       WPM over a sliding time window, at every typed key
+    burst WPM         fastest run of BURST_KEYS consecutive keys
+    consistency       coefficient of variation of the inter-key intervals
+    key error rates   errors / presses per keysym
+    recovery time     time from the first key of an error run to the next correct key
+
+Usage:
+    python analytics.py logs/ > report.jsonl
+"""
+
+RECORD_DTYPE = np.dtype([("delta_ns", "<u8"), ("keysym", "<u4"), ("result", "u1"), ("pad", "V3")])
+assert RECORD_DTYPE.itemsize == keylog.RECORD.size
+
+ROLLING_WINDOW = 5.0
+BURST_KEYS = 10
+# Gaps longer than this are pauses and are left out of the consistency measure
+MAX_INTERVAL = 2.0
+
+
+class SessionArrays(typing.NamedTuple):
+    metadata: typing.Dict[str, typing.Any]
+    started_ns: int
+    # Seconds since the round started, one entry per record
+    times: np.ndarray
+    keysyms: np.ndarray
+    results: np.ndarray
+
+
+def load_session(path: str) -> SessionArrays:
+    with open(path, "rb") as f:
+        started_ns, metadata = keylog.read_header(f)
+        data = f.read()
+    usable = len(data) - len(data) % RECORD_DTYPE.itemsize
+    records = np.frombuffer(data[:usable], dtype=RECORD_DTYPE)
+    deltas = records["delta_ns"].copy()
+    deltas[list(keylog.paused_records(records["result"].tobytes()))] = 0
+    times = np.cumsum(deltas, dtype=np.uint64).astype(np.float64) / 1e9
+    return SessionArrays(metadata, started_ns, times, records["keysym"], records["result"])
+
+
+def typed_mask(results: np.ndarray) -> np.ndarray:
+    """Keys that typed a character, the ones calculate_wpm counts."""
+    return (results == session.CORRECT) | (results == session.INCORRECT)
+
+
+def rolling_wpm(times: np.ndarray, window: float = ROLLING_WINDOW) -> np.ndarray:
+    """WPM over the `window` seconds up to each typed key (times of typed keys only)."""
+    if not len(times):
+        return np.zeros(0)
+    first = np.searchsorted(times, times - window, side="right")
+    counts = np.arange(1, len(times) + 1) - first
+    span = np.minimum(np.maximum(times, 1e-9), window)
+    return counts / 5 / span * 60
+
+
+def burst_wpm(times: np.ndarray, keys: int = BURST_KEYS) -> float:
+    """Fastest WPM over any run of `keys` consecutive typed keys."""
+    if len(times) < keys:
+        return 0.0
+    spans = times[keys - 1:] - times[:len(times) - keys + 1]
+    spans = spans[spans > 0]
+    if not len(spans):
+        return 0.0
+    return float((keys - 1) / 5 / spans.min() * 60)
+
+
+def consistency(times: np.ndarray, max_interval: float = MAX_INTERVAL) -> float:
+    """Coefficient of variation of inter-key intervals; lower is steadier."""
+    intervals = np.diff(times)
+    intervals = intervals[(intervals > 0) & (intervals < max_interval)]
+    if len(intervals) < 2:
+        return 0.0
+    return float(intervals.std() / intervals.mean())
+
+
+def key_error_rates(keysyms: np.ndarray, results: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (keysyms, presses, errors) for every key that typed a character."""
+    mask = typed_mask(results)
+    keys, inverse = np.unique(keysyms[mask], return_inverse=True)
+    presses = np.bincount(inverse, minlength=len(keys))
+    errors = np.bincount(inverse, weights=results[mask] == session.INCORRECT, minlength=len(keys)).astype(np.int64)
+    return keys, presses, errors
+
+
+def recovery_times(times: np.ndarray, results: np.ndarray) -> np.ndarray:
+    """Seconds from the start of each run of errors to the next correct key."""
+    mask = typed_mask(results)
+    typed_times = times[mask]
+    typed_results = results[mask]
+    incorrect = typed_results == session.INCORRECT
+    run_starts = incorrect & ~np.concatenate(([False], incorrect[:-1]))
+    error_times = typed_times[run_starts]
+    correct_times = typed_times[~incorrect]
+    following = np.searchsorted(correct_times, error_times, side="right")
+    recovered = following < len(correct_times)
+    return correct_times[following[recovered]] - error_times[recovered]
+
+
+def analyse(arrays: SessionArrays) -> typing.Dict[str, typing.Any]:
+    mask = typed_mask(arrays.results)
+    typed_times = arrays.times[mask]
+    typed_characters = int(mask.sum())
+    correct_characters = int((arrays.results == session.CORRECT).sum())
+    elapsed = float(arrays.times[-1]) if len(arrays.times) else 0.0
+    keys, presses, errors = key_error_rates(arrays.keysyms, arrays.results)
+    rolling = rolling_wpm(typed_times)
+    recovery = recovery_times(arrays.times, arrays.results)
+    return {
+        "user": arrays.metadata.get("user"),
+        "mode": arrays.metadata.get("mode"),
+        "level": arrays.metadata.get("level"),
+        "started_ns": arrays.started_ns,
+        "wpm": session.calculate_wpm(typed_characters, elapsed),
+        "accuracy": session.calculate_accuracy(correct_characters, typed_characters),
+        "typed_characters": typed_characters,
+        "peak_rolling_wpm": float(rolling.max()) if len(rolling) else 0.0,
+        "burst_wpm": burst_wpm(typed_times),
+        "consistency": consistency(typed_times),
+        "mean_recovery_time": float(recovery.mean()) if len(recovery) else 0.0,
+        "key_error_rates": {int(key): float(error / press) for key, press, error in zip(keys, presses, errors)},
+    }
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Per-session typing analytics from key logs, as JSON lines.")
+    parser.add_argument("paths", nargs="+", help="key log files or directories of them")
+    args = parser.parse_args(argv)
+    for path in keylog.iter_log_paths(args.paths):
+        try:
+            report = analyse(load_session(path))
+        except (OSError, ValueError) as error:
+            print(f"{path}: {error}", file=sys.stderr)
+            continue
+        report["path"] = path
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import array
+import random
+import time
+import typing
+
+import session
+from session import TypingSession, char_keysym
+
+
+"""
+Keystroke replay benchmark for TypingSession.
+
+Feeds synthetic (keysym, timestamp) events through the headless session engine
+and reports throughput and per-event latency percentiles.
+
+Usage:
+    python -m benchmarks.replay --events 2000000 --error-rate 0.05
+"""
+
+
+def synthetic_keystrokes(words: typing.Sequence[str], count: int, error_rate: float,
+                         seed: int = 0) -> typing.List[str]:
+    """Build a keysym script that types `words` with occasional typos and fixes."""
+    rng = random.Random(seed)
+    keysyms: typing.List[str] = []
+    while len(keysyms) < count:
+        for word in words:
+            for char in word:
+                if rng.random() < error_rate:
+                    keysyms.append(char_keysym(rng.choice(word)))
+                    keysyms.append("BackSpace")
+                keysyms.append(char_keysym(char))
+            keysyms.append("Return")
+    del keysyms[count:]
+    return keysyms
+
+
+def replay(words: typing.Sequence[str], keysyms: typing.Sequence[str], events: int,
+           interval: float, latencies: typing.Optional[array.array] = None) -> float:
+    """Feed `events` keystrokes through a session and return the wall time taken."""
+    typing_session = TypingSession(words, time_limit=float("inf"))
+    on_key = typing_session.on_key
+    perf_counter_ns = time.perf_counter_ns
+    script_len = len(keysyms)
+    timestamp = 0.0
+    started = time.perf_counter()
+    for i in range(events):
+        keysym = keysyms[i % script_len]
+        timestamp += interval
+        if latencies is None:
+            result = on_key(keysym, timestamp)
+        else:
+            before = perf_counter_ns()
+            result = on_key(keysym, timestamp)
+            latencies[i] = perf_counter_ns() - before
+        if result == session.END:
+            typing_session.start(timestamp)
+    return time.perf_counter() - started
+
+
+def percentile(sorted_values: typing.Sequence[int], fraction: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay synthetic keystrokes through TypingSession.")
+    parser.add_argument("--words", default="words.txt", help="word list to type")
+    parser.add_argument("--events", type=int, default=2_000_000, help="number of key events to replay")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="chance of a typo per character")
+    parser.add_argument("--wpm", type=float, default=120, help="simulated typing speed")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with open(args.words, "r") as f:
+        words = f.read().splitlines()
+    keysyms = synthetic_keystrokes(words, min(args.events, 100_000), args.error_rate, args.seed)
+    interval = 60 / (args.wpm * 5)
+
+    elapsed = replay(words, keysyms, args.events, interval)
+    print(f"events: {args.events}")
+    print(f"throughput: {args.events / elapsed:,.0f} events/sec")
+
+    latencies = array.array("Q", bytes(8 * args.events))
+    replay(words, keysyms, args.events, interval, latencies)
+    ordered = sorted(latencies)
+    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999)):
+        print(f"latency {label}: {percentile(ordered, fraction)} ns")
+    print(f"latency max: {ordered[-1]} ns")
+
+
+if __name__ == "__main__":
+    main()
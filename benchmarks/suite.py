@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+# The result screen must never open a real window while benchmarking
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import corpora
+import corpus
+import session
+from benchmarks.replay import replay, synthetic_keystrokes
+from session import TypingSession
+from view import LabelView
+
+
+"""
+Headless benchmark suite with regression thresholds.
+
+Times the game's hot paths and compares them with a JSON baseline:
+
+    corpus.*     compiling, opening and fully loading (sampler + bigram index)
+                 generated corpora of each --corpus-sizes size, and a cache hit
+    session.*    the headless engine: one key, one update_ui's worth of labels
+    gui.*        on_key_pressed, update_ui, a key through to the repaint, and
+                 end_game with its result screen, in a real FastTypeGame
+    startup.*    a fresh interpreter to the first painted frame
+
+Tk runs under Xvfb when there is no display (the gui and startup metrics are
+skipped if neither is available) and pygame uses SDL's dummy video driver.
+All metrics are seconds, lower is better; each is the fastest of --repeat runs,
+which is far less noisy than the mean or median on a shared machine.
+A metric regresses when it is slower than its baseline by more than its
+threshold (the baseline file's "thresholds", falling back to --threshold).
+
+Timings depend on the machine, so no baseline is shipped; record one on the
+target hardware first.
+
+Usage:
+    python -m benchmarks.suite --update-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = os.path.join(ROOT, "words.txt")
+LETTERS = "etaoinshrdlcumwfgypbvkjxqz"
+DEFAULT_THRESHOLD = 0.25
+KEY_EVENTS = 20_000
+GUI_KEY_EVENTS = 2_000
+
+# Imports main first, as `python main.py` does, then prints the import-to-first-frame time and quits.
+# The report is queued behind on_first_frame, which takes that measurement.
+STARTUP_CHILD = """
+import sys
+import main
+def ready(game):
+    game.window.after_idle(lambda: (print(game.startup_time), game.quit_game()))
+main.run(main.parse_args(["--no-log", "--scores", sys.argv[1]]), on_ready=ready)
+"""
+
+Results = typing.Dict[str, float]
+
+
+def best_time(function: typing.Callable[[], typing.Any], repeat: int, per: int = 1) -> float:
+    """Fastest of `repeat` calls of `function`, in seconds per each of the `per` operations it does."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, (time.perf_counter() - started) / per)
+    return best
+
+
+def write_corpus(path: str, words: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for _ in range(words):
+            f.write("".join(rng.choices(LETTERS, k=rng.randint(2, 12))))
+            f.write("\n")
+
+
+def bench_corpus(sizes: typing.Sequence[int], repeat: int, directory: str) -> Results:
+    results: Results = {}
+    for size in sizes:
+        source = os.path.join(directory, f"words-{size}.txt")
+        write_corpus(source, size)
+        compiled = source + corpus.COMPILED_SUFFIX
+
+        def compile_cold() -> None:
+            if os.path.exists(compiled):
+                os.remove(compiled)
+            corpus.open_corpus(source).close()
+
+        results[f"corpus.compile.{size}"] = best_time(compile_cold, repeat)
+        results[f"corpus.open.{size}"] = best_time(lambda: corpus.open_corpus(source).close(), repeat)
+        results[f"corpus.load.{size}"] = best_time(lambda: corpora.load_corpus(source), repeat)
+        cache = corpora.CorpusCache()
+        cache.get(source)
+        results[f"corpus.cache_hit.{size}"] = best_time(lambda: [cache.get(source) for _ in range(1000)],
+                                                          repeat, per=1000)
+        cache.close()
+    return results
+
+
+class _Label:
+    def configure(self, **options: typing.Any) -> None:
+        pass
+
+
+def bench_session(repeat: int) -> Results:
+    with open(WORDS) as f:
+        words = f.read().split()
+    keysyms = synthetic_keystrokes(words, KEY_EVENTS, error_rate=0.05)
+    results: Results = {}
+    results["session.key"] = best_time(lambda: replay(words, keysyms, KEY_EVENTS, 0.1), repeat, per=KEY_EVENTS)
+
+    typing_session = TypingSession(words, time_limit=float("inf"))
+    view = LabelView()
+    for name in ("timer", "wpm", "accuracy", "typed_characters", "correct_characters", "incorrect_characters"):
+        view.bind(name, _Label(), name + ": {}")
+
+    def updates() -> None:
+        # update_ui's work for a tick after each key
+        timestamp = 0.0
+        for keysym in keysyms:
+            timestamp += 0.1
+            if typing_session.on_key(keysym, timestamp) == session.END:
+                typing_session.start(timestamp)
+            score = typing_session.snapshot(timestamp)
+            view.set("timer", int(score.elapsed_time))
+            view.set("wpm", int(score.wpm))
+            view.set("accuracy", int(score.accuracy))
+            view.set("typed_characters", score.typed_characters)
+            view.set("correct_characters", score.correct_characters)
+            view.set("incorrect_characters", score.incorrect_characters)
+            view.end_tick()
+
+    results["session.key_and_update"] = best_time(updates, repeat, per=len(keysyms))
+    return results
+
+
+def tk_available() -> bool:
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+    except Exception:
+        return False
+    return True
+
+
+def start_virtual_display() -> typing.Optional[subprocess.Popen]:
+    """Start Xvfb and point DISPLAY at it, if Tk can't open a display otherwise."""
+    if tk_available():
+        return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None
+    for number in range(99, 120):
+        process = subprocess.Popen([xvfb, f":{number}", "-nolisten", "tcp", "-screen", "0", "1024x1280x24"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.environ["DISPLAY"] = f":{number}"
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and process.poll() is None:
+            if tk_available():
+                return process
+            time.sleep(0.1)
+        process.kill()
+        process.wait()
+    del os.environ["DISPLAY"]
+    return None
+
+
+class _KeyEvent:
+    def __init__(self, keysym: str) -> None:
+        self.keysym = keysym
+        self.keysym_num = ord(keysym) if len(keysym) == 1 else 0
+        self.char = session.keysym_to_char(keysym) or ""
+        self.state = 0
+
+
+def bench_gui(repeat: int, directory: str) -> Results:
+    import main
+
+    results: Results = {}
+    events = [_KeyEvent(keysym) for keysym in synthetic_keystrokes(["benchmark", "typing", "game"],
+                                                                   GUI_KEY_EVENTS, error_rate=0.05)]
+
+    def run(game: typing.Any) -> None:
+        try:
+            game.time_limit = 10 ** 9
+
+            def new_round() -> None:
+                game.result_screen.hide()
+                game.start_game()
+                # Drive update_ui by hand, not from the scheduler's after() chain
+                game.refresh.stop()
+
+            def keys() -> None:
+                for event in events:
+                    game.on_key_pressed(event)
+
+            def updates() -> None:
+                for _ in range(GUI_KEY_EVENTS):
+                    game.update_ui()
+
+            def keys_to_frame() -> None:
+                for event in events:
+                    game.on_key_pressed(event)
+                    game.update_ui()
+                    game.window.update_idletasks()
+
+            new_round()
+            results["gui.key"] = best_time(keys, repeat, per=len(events))
+            results["gui.update_ui"] = best_time(updates, repeat, per=GUI_KEY_EVENTS)
+            results["gui.key_to_frame"] = best_time(keys_to_frame, repeat, per=len(events))
+
+            end_times = []
+            for _ in range(repeat + 1):
+                new_round()
+                keys()
+                started = time.perf_counter()
+                game.end_game()
+                game.window.update_idletasks()
+                end_times.append(time.perf_counter() - started)
+            # The first one also starts pygame
+            results["gui.end_game.first"] = end_times[0]
+            results["gui.end_game"] = min(end_times[1:])
+        finally:
+            game.quit_game()
+
+    main.FastTypeGame(scores=os.path.join(directory, "scores.db"), log_dir=None, corpora=[WORDS],
+                      on_ready=lambda game: game.window.after(100, run, game))
+    return results
+
+
+def bench_startup(repeat: int, directory: str) -> Results:
+    wall = []
+    first_frame = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_CHILD, os.path.join(directory, "scores.db")],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        wall.append(time.perf_counter() - started)
+        first_frame.append(float(output.splitlines()[-1]))
+    return {"startup.first_frame": min(first_frame), "startup.process": min(wall)}
+
+
+def compare(results: Results, baseline: typing.Dict[str, typing.Any], default_threshold: float) -> bool:
+    """Print each metric against its baseline; return False if any regressed."""
+    thresholds = baseline.get("thresholds", {})
+    default_threshold = thresholds.get("default", default_threshold)
+    passed = True
+    print(f"{'metric':32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in sorted(results.items()):
+        expected = baseline.get("metrics", {}).get(name)
+        if expected is None:
+            print(f"{name:32} {'-':>12} {value:12.6g} {'new':>8}")
+            continue
+        change = value / expected - 1 if expected > 0 else 0
+        threshold = thresholds.get(name, default_threshold)
+        regressed = change > threshold
+        passed = passed and not regressed
+        print(f"{name:32} {expected:12.6g} {value:12.6g} {change:+8.1%}{'  REGRESSED' if regressed else ''}")
+    for name in sorted(set(baseline.get("metrics", {})) - set(results)):
+        print(f"{name:32} {'':>12} {'skipped':>12}")
+    return passed
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths and check them against a baseline.")
+    parser.add_argument("--baseline", metavar="FILE", help="fail if any metric regresses against this baseline")
+    parser.add_argument("--update-baseline", metavar="FILE", help="write the results as the new baseline")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown (0.25 = 25%%) for metrics the baseline has no threshold for")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per metric (the fastest is kept)")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000, 5_000_000],
+                        help="words in each generated corpus")
+    parser.add_argument("--skip", nargs="+", default=[], choices=("corpus", "session", "gui", "startup"),
+                        help="groups of metrics to leave out")
+    args = parser.parse_args(argv)
+    baseline: typing.Optional[typing.Dict[str, typing.Any]] = None
+    if args.baseline:
+        # Fail before spending minutes on benchmarks that have nothing to compare against
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            parser.error(f"no baseline at {args.baseline}; record one first with --update-baseline {args.baseline}")
+        except (OSError, ValueError) as error:
+            parser.error(f"unable to read baseline {args.baseline}: {error}")
+
+    results: Results = {}
+    display = start_virtual_display()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            if "corpus" not in args.skip:
+                results.update(bench_corpus(args.corpus_sizes, args.repeat, directory))
+            if "session" not in args.skip:
+                results.update(bench_session(args.repeat))
+            if display is not None or tk_available():
+                if "gui" not in args.skip:
+                    results.update(bench_gui(args.repeat, directory))
+                if "startup" not in args.skip:
+                    results.update(bench_startup(args.repeat, directory))
+            else:
+                print("No display and no Xvfb; skipping the gui and startup metrics", file=sys.stderr)
+    finally:
+        if display is not None:
+            display.terminate()
+            display.wait()
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "metrics": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    passed = True
+    if baseline is not None:
+        passed = compare(results, baseline, args.threshold)
+    else:
+        for name, value in sorted(results.items()):
+            print(f"{name:32} {value:12.6g}")
+
+    if args.update_baseline:
+        thresholds = {"default": args.threshold}
+        if os.path.exists(args.update_baseline):
+            with open(args.update_baseline) as f:
+                thresholds = json.load(f).get("thresholds", thresholds)
+        with open(args.update_baseline, "w") as f:
+            json.dump(dict(report, thresholds=thresholds), f, indent=2)
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import collections
+import os
+import queue
+import sys
+import threading
+import typing
+
+import corpus
+from corpus import CompiledCorpus
+from levels import WordSampler
+from practice import BigramIndex
+
+
+"""
+Corpus cache
+
+Keeps loaded corpora in memory so switching between word lists (languages,
+code vocabularies, custom lists) between rounds costs a dictionary lookup and
+a stat instead of disk reads and index builds. An entry holds the compiled
+corpus together with its WordSampler and BigramIndex, keyed by the source path
+and its mtime so an edited list is reloaded. Entries are evicted least
+recently used first once their total size passes the byte budget.
+
+prefetch() loads a corpus on a background thread, e.g. while the game over
+screen is up. A current compiled corpus is only mapped, so prefetching mostly
+pays off for a new or edited list that has to be compiled first.
+"""
+
+
+# Word lists up to this size compile on load in about a second; bigger ones must be compiled ahead of time
+MAX_COMPILE_BYTES = 1 << 20
+
+
+class LoadedCorpus(typing.NamedTuple):
+    path: str
+    mtime_ns: int
+    words: CompiledCorpus
+    sampler: WordSampler
+    index: BigramIndex
+    # Bytes held by the corpus, sampler and index
+    size: int
+
+
+def _nbytes(buffer: typing.Any) -> int:
+    return memoryview(buffer).nbytes
+
+
+def load_corpus(path: str) -> LoadedCorpus:
+    mtime_ns = os.stat(path).st_mtime_ns
+    words = corpus.open_corpus(path, MAX_COMPILE_BYTES)
+    sampler = WordSampler(words)
+    index = BigramIndex(words)
+    size = sum(map(_nbytes, (words.offsets, words.lengths, words.char_classes, words.rarity, words.bucket_starts,
+                             words.bucket_words, words.bigram_starts, words.bigram_postings, words.blob)))
+    return LoadedCorpus(path, mtime_ns, words, sampler, index, size)
+
+
+class CorpusCache:
+    """Memory-bounded LRU cache of loaded corpora with background prefetching."""
+
+    def __init__(self, max_bytes: int = 256 << 20,
+                 loader: typing.Callable[[str], LoadedCorpus] = load_corpus) -> None:
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: "collections.OrderedDict[typing.Tuple[str, int], LoadedCorpus]" = collections.OrderedDict()
+        # Keys being loaded right now, so a get() waits for a prefetch instead of loading twice
+        self._loading: typing.Dict[typing.Tuple[str, int], threading.Event] = {}
+        self._lock = threading.Lock()
+        self._requests: "queue.SimpleQueue[typing.Optional[str]]" = queue.SimpleQueue()
+        self._prefetcher = threading.Thread(target=self._prefetch_loop, name="corpus-prefetch", daemon=True)
+        self._prefetcher.start()
+
+    @staticmethod
+    def key(path: str) -> typing.Tuple[str, int]:
+        return os.path.abspath(path), os.stat(path).st_mtime_ns
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: str) -> bool:
+        try:
+            return self.key(path) in self._entries
+        except OSError:
+            return False
+
+    def get(self, path: str) -> LoadedCorpus:
+        """Return the loaded corpus for `path`, loading it on a miss."""
+        key = self.key(path)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                loading = self._loading.get(key)
+                if loading is None:
+                    self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Being prefetched; use that result (or load it here if the prefetch failed)
+            loading.wait()
+        try:
+            entry = self.loader(path)
+            with self._lock:
+                self._insert(key, entry)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+        return entry
+
+    def prefetch(self, path: str) -> None:
+        """Load `path` in the background if it isn't cached already."""
+        self._requests.put(path)
+
+    def close(self) -> None:
+        self._requests.put(None)
+        self._prefetcher.join()
+
+    def _insert(self, key: typing.Tuple[str, int], entry: LoadedCorpus) -> None:
+        # An older version of the same file will never be asked for again
+        for stale in [other for other in self._entries if other[0] == key[0]]:
+            self.size -= self._entries.pop(stale).size
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def _prefetch_loop(self) -> None:
+        while True:
+            path = self._requests.get()
+            if path is None:
+                break
+            if path in self:
+                continue
+            try:
+                self.get(path)
+            except (OSError, ValueError) as error:
+                print(f"Unable to prefetch {path}: {error}", file=sys.stderr)
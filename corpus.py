@@ -0,0 +1,357 @@
+import argparse
+import array
+import hashlib
+import io
+import math
+import mmap
+import os
+import struct
+import typing
+from collections.abc import Sequence
+
+
+"""
+Word corpora
+
+CompiledCorpus reads a word list (one word per line) compiled into one file
+(`<path>.tapc`) that opens with no parsing, so a multi-million-entry
+dictionary is never copied into a Python list. The file holds a header, an
+offset table into a single UTF-8 blob, and per-word metadata columns used for
+level selection:
+
+    lengths (H)       number of characters in the word
+    char_classes (B)  bit mask of CLASS_* flags for the characters it contains
+    rarity (f)        mean rare-letter score of its characters
+
+then the word indices sorted by difficulty bucket (see bucket_of) for level
+selection: `bucket_words[bucket_starts[k]:bucket_starts[k + 1]]` (I) are the
+words in bucket k, in corpus order. Last comes an inverted bigram index in the
+same CSR form for adaptive practice:
+`bigram_starts[b]:bigram_starts[b + 1]` (I) is the slice of `bigram_postings`
+(I) holding, in order, the index of every word containing ASCII bigram
+b = first * ALPHABET + second.
+
+Every section is a plain array, so opening it is an mmap plus memoryview casts.
+The file records the source's size, mtime and hash; open_corpus rebuilds it
+only when the source has actually changed. Compiling a large list takes
+seconds, so callers that must not stall (the game) pass max_compile_bytes and
+get a ValueError naming the command to run instead.
+
+Compile word lists ahead of time with:
+    python corpus.py words.txt
+"""
+
+COMPILED_SUFFIX = ".tapc"
+COMPILED_MAGIC = b"TAPC"
+COMPILED_VERSION = 3
+# magic, version, offset typecode, padding, word count, blob size,
+# source size, source mtime_ns, source hash, bigram posting count
+COMPILED_HEADER = struct.Struct("<4sHc1xQQQQ16sQ")
+# Bigrams are indexed over ASCII characters only
+ALPHABET = 128
+
+# Upper bounds (inclusive) of the word-length buckets; longer words go in the last one
+LENGTH_BUCKETS = (4, 6, 9)
+# Upper bounds (exclusive) of the rare-letter score buckets, see LETTER_FREQUENCIES
+RARITY_BUCKETS = (1.5, 2.5, 3.5)
+BUCKET_COUNT = (len(LENGTH_BUCKETS) + 1) * (len(RARITY_BUCKETS) + 1)
+
+CLASS_LOWER = 1
+CLASS_UPPER = 2
+CLASS_DIGIT = 4
+CLASS_PUNCT = 8
+CLASS_OTHER = 16
+
+# Relative frequency (%) of letters in English text
+LETTER_FREQUENCIES: typing.Dict[str, float] = {
+    "e": 12.7, "t": 9.1, "a": 8.2, "o": 7.5, "i": 7.0, "n": 6.7, "s": 6.3,
+    "h": 6.1, "r": 6.0, "d": 4.3, "l": 4.0, "c": 2.8, "u": 2.8, "m": 2.4,
+    "w": 2.4, "f": 2.2, "g": 2.0, "y": 2.0, "p": 1.9, "b": 1.5, "v": 0.98,
+    "k": 0.77, "j": 0.15, "x": 0.15, "q": 0.095, "z": 0.074,
+}
+# Score for characters that are not letters, roughly as awkward as "v"
+NON_LETTER_RARITY = 4.0
+
+
+def _byte_tables() -> typing.Tuple[typing.List[int], typing.List[float]]:
+    classes = [CLASS_OTHER] * 256
+    rarity = [NON_LETTER_RARITY] * 256
+    top = max(LETTER_FREQUENCIES.values())
+    for byte in range(128):
+        char = chr(byte)
+        if char.islower():
+            classes[byte] = CLASS_LOWER
+        elif char.isupper():
+            classes[byte] = CLASS_UPPER
+        elif char.isdigit():
+            classes[byte] = CLASS_DIGIT
+        elif char.isprintable():
+            classes[byte] = CLASS_PUNCT
+        frequency = LETTER_FREQUENCIES.get(char.lower())
+        if frequency is not None:
+            rarity[byte] = math.log2(top / frequency)
+    # UTF-8 continuation bytes belong to the character their lead byte started
+    for byte in range(0x80, 0xC0):
+        rarity[byte] = 0
+    return classes, rarity
+
+
+BYTE_CLASSES, BYTE_RARITY = _byte_tables()
+
+
+def bucket_of(length: int, rarity: float) -> int:
+    length_bucket = len(LENGTH_BUCKETS)
+    for i, bound in enumerate(LENGTH_BUCKETS):
+        if length <= bound:
+            length_bucket = i
+            break
+    rarity_bucket = len(RARITY_BUCKETS)
+    for i, bound in enumerate(RARITY_BUCKETS):
+        if rarity < bound:
+            rarity_bucket = i
+            break
+    return length_bucket * (len(RARITY_BUCKETS) + 1) + rarity_bucket
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _section_layout(header_size: int, count: int, offset_size: int,
+                    posting_count: int) -> typing.Tuple[int, ...]:
+    """Return the start of the offsets, lengths, classes, rarity, bucket starts, bucket words,
+    bigram starts, postings and blob sections."""
+    offsets_at = _aligned(header_size)
+    lengths_at = _aligned(offsets_at + (count + 1) * offset_size)
+    classes_at = _aligned(lengths_at + count * 2)
+    rarity_at = _aligned(classes_at + count)
+    bucket_starts_at = _aligned(rarity_at + count * 4)
+    bucket_words_at = _aligned(bucket_starts_at + (BUCKET_COUNT + 1) * 4)
+    starts_at = _aligned(bucket_words_at + count * 4)
+    postings_at = _aligned(starts_at + (ALPHABET * ALPHABET + 1) * 4)
+    blob_at = _aligned(postings_at + posting_count * 4)
+    return (offsets_at, lengths_at, classes_at, rarity_at, bucket_starts_at, bucket_words_at,
+            starts_at, postings_at, blob_at)
+
+
+def hash_file(path: str) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _bucket_words(buckets: array.array) -> typing.Tuple[array.array, array.array]:
+    """Counting-sort the word indices by bucket, returning (bucket starts, words)."""
+    counts = [0] * BUCKET_COUNT
+    for bucket in buckets:
+        counts[bucket] += 1
+    starts = array.array("I", bytes(4 * (BUCKET_COUNT + 1)))
+    for bucket in range(BUCKET_COUNT):
+        starts[bucket + 1] = starts[bucket] + counts[bucket]
+    fill = starts.tolist()
+    words = array.array("I", bytes(4 * len(buckets)))
+    for index, bucket in enumerate(buckets):
+        words[fill[bucket]] = index
+        fill[bucket] += 1
+    return starts, words
+
+
+def _word_bigrams(blob: bytes, offsets: array.array,
+                  count: int) -> typing.Iterator[typing.Tuple[int, typing.Set[typing.Tuple[int, int]]]]:
+    """Yield each word's index with the distinct byte pairs in it, one word at a time."""
+    for index in range(count):
+        word = blob[offsets[index]:offsets[index + 1]]
+        yield index, set(zip(word, word[1:]))
+
+
+def _bigram_postings(blob: bytes, offsets: array.array, count: int) -> typing.Tuple[array.array, array.array]:
+    """Build the bigram -> word index in two streaming passes over the words: count, then fill."""
+    size = ALPHABET * ALPHABET
+    counts = [0] * size
+    for _, pairs in _word_bigrams(blob, offsets, count):
+        for first, second in pairs:
+            if first < ALPHABET and second < ALPHABET:
+                counts[first * ALPHABET + second] += 1
+
+    starts = array.array("I", bytes(4 * (size + 1)))
+    total = 0
+    for bigram in range(size):
+        total += counts[bigram]
+        starts[bigram + 1] = total
+    fill = starts.tolist()
+    postings = array.array("I", bytes(4 * total))
+    for index, pairs in _word_bigrams(blob, offsets, count):
+        for first, second in pairs:
+            if first < ALPHABET and second < ALPHABET:
+                bigram = first * ALPHABET + second
+                postings[fill[bigram]] = index
+                fill[bigram] += 1
+    return starts, postings
+
+
+def compile_corpus(source: str, out: typing.BinaryIO) -> None:
+    """Write the compiled form of the word list at `source` to `out`."""
+    stat = os.stat(source)
+    source_hash = hash_file(source)
+    blob = bytearray()
+    offsets = array.array("I" if stat.st_size < 2 ** 32 else "Q", [0])
+    lengths = array.array("H")
+    classes = array.array("B")
+    rarity = array.array("f")
+    buckets = array.array("B")
+    byte_classes = BYTE_CLASSES
+    byte_rarity = BYTE_RARITY
+    with open(source, "rb") as f:
+        for line in f:
+            word = line.rstrip(b"\r\n")
+            if not word:
+                continue
+            length = len(word.decode("utf-8"))
+            mask = 0
+            for byte in set(word):
+                mask |= byte_classes[byte]
+            blob += word
+            offsets.append(len(blob))
+            lengths.append(min(length, 0xFFFF))
+            classes.append(mask)
+            rarity.append(sum(map(byte_rarity.__getitem__, word)) / length)
+            # Bucketed by the stored (single precision) score, as a reader would see it
+            buckets.append(bucket_of(length, rarity[-1]))
+
+    count = len(lengths)
+    bucket_starts, bucket_words = _bucket_words(buckets)
+    starts, postings = _bigram_postings(bytes(blob), offsets, count)
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, offsets.typecode.encode(), count,
+                                  len(blob), stat.st_size, stat.st_mtime_ns, source_hash, len(postings))
+    sections = _section_layout(len(header), count, offsets.itemsize, len(postings))
+    position = 0
+    for start, data in zip((0,) + sections, (header, offsets, lengths, classes, rarity, bucket_starts, bucket_words,
+                                             starts, postings, blob)):
+        out.write(bytes(start - position))
+        out.write(data)
+        position = start + len(data) * getattr(data, "itemsize", 1)
+
+
+class CompiledCorpus(Sequence):
+    """Read-only sequence of words backed by a compiled corpus buffer."""
+
+    def __init__(self, data: typing.Union[bytes, mmap.mmap]) -> None:
+        self._data = data
+        (magic, version, typecode, count, blob_size, self.source_size, self.source_mtime_ns,
+         self.source_hash, posting_count) = COMPILED_HEADER.unpack_from(data)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION or typecode not in (b"I", b"Q"):
+            raise ValueError("not a compiled corpus")
+        if count == 0:
+            raise ValueError("compiled corpus contains no words")
+        view = memoryview(data)
+        (offsets_at, lengths_at, classes_at, rarity_at, bucket_starts_at, bucket_words_at,
+         starts_at, postings_at, blob_at) = _section_layout(COMPILED_HEADER.size, count,
+                                                            4 if typecode == b"I" else 8, posting_count)
+        self.offsets = view[offsets_at:lengths_at].cast(typecode.decode())[:count + 1]
+        self.lengths = view[lengths_at:classes_at].cast("H")[:count]
+        self.char_classes = view[classes_at:classes_at + count]
+        self.rarity = view[rarity_at:bucket_starts_at].cast("f")[:count]
+        self.bucket_starts = view[bucket_starts_at:bucket_words_at].cast("I")[:BUCKET_COUNT + 1]
+        self.bucket_words = view[bucket_words_at:starts_at].cast("I")[:count]
+        self.bigram_starts = view[starts_at:postings_at].cast("I")[:ALPHABET * ALPHABET + 1]
+        self.bigram_postings = view[postings_at:blob_at].cast("I")[:posting_count]
+        self.blob = view[blob_at:blob_at + blob_size]
+
+    @classmethod
+    def open(cls, path: str) -> "CompiledCorpus":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+    def close(self) -> None:
+        for view in (self.offsets, self.lengths, self.char_classes, self.rarity, self.bucket_starts,
+                     self.bucket_words, self.bigram_starts, self.bigram_postings, self.blob):
+            view.release()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+
+def is_current(corpus: CompiledCorpus, source: str) -> bool:
+    """Check a compiled corpus against its source, hashing only when the mtime moved."""
+    stat = os.stat(source)
+    if corpus.source_size != stat.st_size:
+        return False
+    if corpus.source_mtime_ns == stat.st_mtime_ns:
+        return True
+    return corpus.source_hash == hash_file(source)
+
+
+def refresh_mtime(path: str, corpus: CompiledCorpus, source: str) -> None:
+    """Record the source's new mtime so an unchanged but touched file isn't hashed every launch."""
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, corpus.offsets.format.encode(),
+                                  len(corpus), len(corpus.blob), corpus.source_size,
+                                  os.stat(source).st_mtime_ns, corpus.source_hash, len(corpus.bigram_postings))
+    try:
+        with open(path, "r+b") as f:
+            f.write(header)
+    except OSError:
+        pass
+
+
+def open_corpus(source: str, max_compile_bytes: typing.Optional[int] = None) -> CompiledCorpus:
+    """Open the compiled form of `source`, compiling it first if it is missing or stale.
+
+    A source bigger than `max_compile_bytes` is never compiled here; it raises ValueError instead.
+    """
+    path = source + COMPILED_SUFFIX
+    try:
+        corpus = CompiledCorpus.open(path)
+    except (OSError, ValueError):
+        pass
+    else:
+        if is_current(corpus, source):
+            if corpus.source_mtime_ns != os.stat(source).st_mtime_ns:
+                refresh_mtime(path, corpus, source)
+            return corpus
+        corpus.close()
+
+    if max_compile_bytes is not None and os.stat(source).st_size > max_compile_bytes:
+        raise ValueError(f"{source} has no up-to-date compiled corpus; compile it first with "
+                         f"`python corpus.py {source}`")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            compile_corpus(source, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Can't write next to the source, so keep the compiled corpus in memory
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        buffer = io.BytesIO()
+        compile_corpus(source, buffer)
+        return CompiledCorpus(buffer.getvalue())
+    return CompiledCorpus.open(path)
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile word lists into the binary corpus format.")
+    parser.add_argument("sources", nargs="+", help="word lists to compile")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the compiled corpus is current")
+    args = parser.parse_args(argv)
+    for source in args.sources:
+        if args.force:
+            try:
+                os.remove(source + COMPILED_SUFFIX)
+            except FileNotFoundError:
+                pass
+        corpus = open_corpus(source)
+        print(f"{source}{COMPILED_SUFFIX}: {len(corpus)} words")
+        corpus.close()
+
+
+if __name__ == "__main__":
+    main()
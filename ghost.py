@@ -0,0 +1,61 @@
+import array
+import bisect
+
+import keylog
+import session
+
+
+"""
+Ghost race
+
+A Ghost replays the progress of a recorded round from its key log, so the
+player can race their own best run. Loading walks the log once and builds two
+parallel arrays over the keys that typed a character:
+
+    times     seconds of play since the round started, pauses left out
+    progress  correct characters typed so far, including this key
+
+Where the ghost is at any elapsed time is then one bisect over `times`, so
+update_ui pays O(log n) per tick with no per-tick allocation, however long the
+recorded round was.
+"""
+
+
+class Ghost:
+    """Progress of a recorded round, looked up by elapsed time."""
+
+    def __init__(self, path: str, times: array.array, progress: array.array) -> None:
+        self.path = path
+        self.times = times
+        self.progress = progress
+
+    @classmethod
+    def from_log(cls, path: str) -> "Ghost":
+        times = array.array("d")
+        progress = array.array("I")
+        elapsed_ns = 0
+        correct = 0
+        for delta_ns, _, result in keylog.iter_play_records(path):
+            elapsed_ns += delta_ns
+            if result == session.END:
+                break
+            if result == session.CORRECT or result == session.INCORRECT:
+                correct += result == session.CORRECT
+                times.append(elapsed_ns / 1e9)
+                progress.append(correct)
+        return cls(path, times, progress)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def typed_at(self, elapsed: float) -> int:
+        """Characters the ghost had typed `elapsed` seconds into its round."""
+        return bisect.bisect_right(self.times, elapsed)
+
+    def correct_at(self, elapsed: float) -> int:
+        """Correct characters the ghost had typed `elapsed` seconds into its round."""
+        typed = bisect.bisect_right(self.times, elapsed)
+        return self.progress[typed - 1] if typed else 0
+
+    def wpm_at(self, elapsed: float) -> float:
+        return session.calculate_wpm(self.typed_at(elapsed), elapsed)
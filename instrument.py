@@ -0,0 +1,120 @@
+import array
+import json
+import sys
+import time
+import typing
+
+
+"""
+Input-to-render latency instrumentation
+
+LatencyProbe timestamps each key on arrival in on_key_pressed, again once the
+session has scored it, and once more after the Tk repaint that shows it.
+Latencies go into log-bucketed histograms per stage:
+
+    score      arrival -> session scored the key
+    render     arrival -> the next repaint finished
+    update_ui  time spent in update_ui itself
+
+The game only holds a probe when instrumentation is switched on, so the cost
+when it is off is one `is not None` check per key and per tick.
+"""
+
+# Each power of two is split into this many buckets (a relative error of at most 25%)
+SUB_BUCKET_BITS = 2
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+
+def bucket_index(value: int) -> int:
+    bits = value.bit_length()
+    if bits <= SUB_BUCKET_BITS:
+        return value
+    shift = bits - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + ((value >> shift) & (SUB_BUCKETS - 1))
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Largest value that falls into bucket `index`."""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((SUB_BUCKETS + index % SUB_BUCKETS + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of nanosecond latencies."""
+
+    def __init__(self) -> None:
+        self.counts = array.array("Q", bytes(8 * BUCKET_COUNT))
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    def record(self, latency_ns: int) -> None:
+        if latency_ns < 0:
+            latency_ns = 0
+        self.counts[bucket_index(latency_ns)] += 1
+        self.count += 1
+        self.total += latency_ns
+        if latency_ns > self.max:
+            self.max = latency_ns
+
+    def percentile(self, fraction: float) -> int:
+        """Upper bound of the bucket holding the given fraction of samples."""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000 if self.count else 0,
+            "p50_us": self.percentile(0.5) / 1000,
+            "p90_us": self.percentile(0.9) / 1000,
+            "p99_us": self.percentile(0.99) / 1000,
+            "max_us": self.max / 1000,
+            "buckets": [[bucket_upper_bound(index), count] for index, count in enumerate(self.counts) if count],
+        }
+
+
+class LatencyProbe:
+    """Collects per-stage key latency histograms for one game."""
+
+    STAGES = ("score", "render", "update_ui")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.pending: typing.List[int] = []
+
+    def key_scored(self, arrived_ns: int) -> None:
+        self.histograms["score"].record(time.perf_counter_ns() - arrived_ns)
+        self.pending.append(arrived_ns)
+
+    def ui_updated(self, started_ns: int) -> None:
+        self.histograms["update_ui"].record(time.perf_counter_ns() - started_ns)
+
+    def frame_rendered(self) -> None:
+        """Called from an idle callback queued behind the repaint of the keys still pending."""
+        if not self.pending:
+            return
+        now = time.perf_counter_ns()
+        render = self.histograms["render"]
+        for arrived_ns in self.pending:
+            render.record(now - arrived_ns)
+        self.pending.clear()
+
+    def dump(self, extra: typing.Optional[typing.Dict[str, typing.Any]] = None) -> None:
+        report: typing.Dict[str, typing.Any] = {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+        if extra:
+            report.update(extra)
+        try:
+            with open(self.path, "w") as f:
+                json.dump(report, f, indent=2)
+        except OSError as error:
+            print(f"Unable to write latency report: {error}", file=sys.stderr)
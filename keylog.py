@@ -0,0 +1,206 @@
+import datetime
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import typing
+
+import session
+
+
+"""
+Keystroke log
+
+Each round is written to its own append-only `.tapk` file: a header with the
+wall-clock start time and JSON metadata, followed by fixed-width records
+
+    delta_ns (Q)  perf_counter_ns since the previous record (the round start for the first)
+    keysym (I)    Tk keysym number of the key
+    result (B)    session.* result the key produced
+
+end_game appends a final record with result session.END, so the time of the
+last record is the length of the round. Pausing appends a session.PAUSE record
+and resuming a session.RESUME one; the delta of the record after a PAUSE is
+time spent paused, which readers leave out of the round's elapsed time
+(paused_records finds those records, iter_play_records zeroes their deltas). A
+player joining a race mid-round starts the log at the round's start, so the
+first delta includes the part of the round they missed.
+
+Records are packed into a preallocated buffer on the UI thread; full buffers
+are handed to a background thread that writes them out, so appending is a
+single struct.pack_into. iter_records streams them back as a generator.
+"""
+
+MAGIC = b"TAPK"
+VERSION = 1
+# magic, version, metadata length, wall-clock start in ns since the epoch
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<QIB3x")
+# Offset of the result byte within a record
+RESULT_OFFSET = 12
+PAUSE_BYTE = bytes([session.PAUSE])
+SUFFIX = ".tapk"
+
+
+class Record(typing.NamedTuple):
+    delta_ns: int
+    keysym: int
+    result: int
+
+
+class KeyLog:
+    """Writes one round's key records at a time to a directory of log files."""
+
+    def __init__(self, directory: str = "logs", chunk_records: int = 4096) -> None:
+        self.directory = directory
+        self.chunk_size = chunk_records * RECORD.size
+        self.path: typing.Optional[str] = None
+        self.records: int = 0
+        self._buffer = bytearray(self.chunk_size)
+        self._position: int = 0
+        self._last_ns: int = 0
+        self._free: "queue.SimpleQueue[bytearray]" = queue.SimpleQueue()
+        self._free.put(bytearray(self.chunk_size))
+        self._jobs: "queue.SimpleQueue[typing.Optional[tuple]]" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="keylog-writer", daemon=True)
+        self._writer.start()
+
+    def start(self, metadata: typing.Dict[str, typing.Any], timestamp_ns: int) -> str:
+        """Begin a new log file; `timestamp_ns` is the round start on the perf_counter_ns clock."""
+        self.finish()
+        started = time.time_ns()
+        name = datetime.datetime.fromtimestamp(started / 1e9).strftime("session-%Y%m%d-%H%M%S-%f")
+        self.path = os.path.join(self.directory, f"{name}-{os.getpid()}{SUFFIX}")
+        encoded = json.dumps(metadata).encode("utf-8")
+        self._jobs.put(("open", self.path, HEADER.pack(MAGIC, VERSION, len(encoded), started) + encoded))
+        self._last_ns = timestamp_ns
+        self.records = 0
+        return self.path
+
+    def append(self, keysym: int, result: int, timestamp_ns: int) -> None:
+        if self.path is None:
+            return
+        RECORD.pack_into(self._buffer, self._position, timestamp_ns - self._last_ns, keysym & 0xFFFFFFFF, result)
+        self._last_ns = timestamp_ns
+        self._position += RECORD.size
+        self.records += 1
+        if self._position == self.chunk_size:
+            self._hand_off()
+
+    def finish(self) -> None:
+        """Queue whatever is buffered and close the current file."""
+        if self.path is None:
+            return
+        if self._position:
+            self._hand_off()
+        self._jobs.put(("close",))
+        self.path = None
+
+    def close(self) -> None:
+        self.finish()
+        self._jobs.put(None)
+        self._writer.join()
+
+    def _hand_off(self) -> None:
+        self._jobs.put(("write", self._buffer, self._position))
+        try:
+            self._buffer = self._free.get_nowait()
+        except queue.Empty:
+            # The writer is behind; grow the pool rather than wait for it
+            self._buffer = bytearray(self.chunk_size)
+        self._position = 0
+
+    def _write_loop(self) -> None:
+        f: typing.Optional[typing.BinaryIO] = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            try:
+                if job[0] == "open":
+                    os.makedirs(self.directory, exist_ok=True)
+                    f = open(job[1], "ab")
+                    f.write(job[2])
+                elif job[0] == "write":
+                    if f is not None:
+                        f.write(memoryview(job[1])[:job[2]])
+                    self._free.put(job[1])
+                elif f is not None:
+                    f.close()
+                    f = None
+            except OSError as error:
+                print(f"Unable to write key log: {error}", file=sys.stderr)
+                f = None
+        if f is not None:
+            f.close()
+
+
+def read_header(f: typing.BinaryIO) -> typing.Tuple[int, typing.Dict[str, typing.Any]]:
+    """Read a log header, returning (wall-clock start ns, metadata)."""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a key log")
+    magic, version, metadata_length, started = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a key log")
+    return started, json.loads(f.read(metadata_length))
+
+
+def _iter_chunks(path: str, chunk_records: int) -> typing.Iterator[bytes]:
+    with open(path, "rb") as f:
+        read_header(f)
+        chunk_size = chunk_records * RECORD.size
+        while True:
+            chunk = f.read(chunk_size)
+            # A crash can leave a partial record at the end; ignore it
+            yield chunk[:len(chunk) - len(chunk) % RECORD.size]
+            if len(chunk) < chunk_size:
+                break
+
+
+def iter_records(path: str, chunk_records: int = 65536) -> typing.Iterator[Record]:
+    """Stream the records of a log file without loading it whole."""
+    for chunk in _iter_chunks(path, chunk_records):
+        for record in RECORD.iter_unpack(chunk):
+            yield Record(*record)
+
+
+def paused_records(results: bytes, after_pause: bool = False) -> typing.Iterator[int]:
+    """Yield the index of each record whose delta is time spent paused, the one after each PAUSE.
+
+    `results` holds one result byte per record, e.g. chunk[RESULT_OFFSET::RECORD.size];
+    reading in chunks, `after_pause` says the previous chunk ended with a PAUSE.
+    """
+    if after_pause and results:
+        yield 0
+    # Pauses are rare, so find them rather than test every record
+    pause = results.find(PAUSE_BYTE)
+    while 0 <= pause < len(results) - 1:
+        yield pause + 1
+        pause = results.find(PAUSE_BYTE, pause + 1)
+
+
+def iter_play_records(path: str, chunk_records: int = 65536) -> typing.Iterator[Record]:
+    """Like iter_records, but with the time spent paused taken out of the deltas."""
+    after_pause = False
+    for chunk in _iter_chunks(path, chunk_records):
+        results = chunk[RESULT_OFFSET::RECORD.size]
+        paused = set(paused_records(results, after_pause))
+        after_pause = results.endswith(PAUSE_BYTE)
+        for index, (delta_ns, keysym, result) in enumerate(RECORD.iter_unpack(chunk)):
+            yield Record(0 if index in paused else delta_ns, keysym, result)
+
+
+def iter_log_paths(paths: typing.Iterable[str]) -> typing.Iterator[str]:
+    """Expand directories into the key logs they contain, lazily."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(SUFFIX):
+                        yield os.path.join(root, name)
+        else:
+            yield path
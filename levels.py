@@ -0,0 +1,111 @@
+import random
+import typing
+
+from corpus import BUCKET_COUNT, RARITY_BUCKETS, CompiledCorpus, bucket_of
+
+
+"""
+Difficulty levels
+
+A level is a weighted distribution over word-length and letter-difficulty
+buckets. compile_corpus stores the corpus sorted into those buckets (see
+corpus.bucket_of), so WordSampler only builds a Walker/Vose alias table per
+level over the non-empty buckets, and drawing a word is two table lookups
+whatever the corpus size. Switching levels only swaps which alias table is
+used.
+"""
+
+
+class Level(typing.NamedTuple):
+    name: str
+    # One weight per length bucket, shortest first
+    length_weights: typing.Tuple[float, float, float, float]
+    # One weight per rarity bucket, most common letters first
+    rarity_weights: typing.Tuple[float, float, float, float]
+
+
+LEVELS: typing.Tuple[Level, ...] = (
+    Level("Easy", (6, 3, 1, 0), (6, 3, 1, 0)),
+    Level("Medium", (2, 4, 3, 1), (3, 4, 2, 1)),
+    Level("Hard", (0, 2, 4, 4), (1, 2, 4, 3)),
+    Level("Expert", (0, 1, 3, 6), (0, 1, 3, 6)),
+)
+DEFAULT_LEVEL = "Medium"
+
+
+def alias_table(weights: typing.Sequence[float]) -> typing.Tuple[typing.List[float], typing.List[int]]:
+    """Build Vose's alias table for drawing index i with probability weights[i] / sum(weights)."""
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    probability = [1.0] * count
+    alias = list(range(count))
+    small = [i for i, weight in enumerate(scaled) if weight < 1]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    # Whatever is left over is 1 up to rounding error
+    return probability, alias
+
+
+class WordSampler:
+    """Picks word indices from a compiled corpus according to the current level."""
+
+    def __init__(self, corpus: CompiledCorpus, levels: typing.Sequence[Level] = LEVELS,
+                 level: str = DEFAULT_LEVEL, rng: typing.Optional[random.Random] = None) -> None:
+        self.corpus = corpus
+        self.levels = {level.name: level for level in levels}
+        self.random = rng or random.Random()
+        self.build_buckets()
+        self.tables = {name: self.level_table(level) for name, level in self.levels.items()}
+        self.set_level(level)
+
+    def build_buckets(self) -> None:
+        """Take the bucket-sorted word indices that compile_corpus stored in the corpus."""
+        starts = self.corpus.bucket_starts
+        self.bucket_words = self.corpus.bucket_words
+        self.bucket_starts = starts.tolist()[:-1]
+        self.bucket_counts = [starts[bucket + 1] - starts[bucket] for bucket in range(len(starts) - 1)]
+
+    def level_table(self, level: Level) -> typing.Tuple[typing.List[int], typing.List[float], typing.List[int]]:
+        """Alias table over the level's non-empty buckets, as (buckets, probability, alias)."""
+        buckets = []
+        weights = []
+        rarity_count = len(RARITY_BUCKETS) + 1
+        for bucket, count in enumerate(self.bucket_counts):
+            weight = level.length_weights[bucket // rarity_count] * level.rarity_weights[bucket % rarity_count]
+            if count and weight > 0:
+                buckets.append(bucket)
+                weights.append(weight)
+        if not buckets:
+            # Nothing in the corpus fits the level, so fall back to any word
+            buckets = [bucket for bucket, count in enumerate(self.bucket_counts) if count]
+            weights = [self.bucket_counts[bucket] for bucket in buckets]
+        probability, alias = alias_table(weights)
+        return buckets, probability, alias
+
+    def set_level(self, name: str) -> None:
+        if name not in self.levels:
+            raise ValueError(f"unknown level {name!r}, expected one of {', '.join(self.levels)}")
+        self.level = name
+        self._buckets, self._probability, self._alias = self.tables[name]
+        self._allowed = bytearray(BUCKET_COUNT)
+        for bucket in self._buckets:
+            self._allowed[bucket] = 1
+
+    def allows(self, index: int) -> bool:
+        """Whether the current level draws from the bucket of word `index`."""
+        return bool(self._allowed[bucket_of(self.corpus.lengths[index], self.corpus.rarity[index])])
+
+    def __call__(self) -> int:
+        rng = self.random
+        slot = rng.randrange(len(self._buckets))
+        if rng.random() >= self._probability[slot]:
+            slot = self._alias[slot]
+        bucket = self._buckets[slot]
+        return self.bucket_words[self.bucket_starts[bucket] + rng.randrange(self.bucket_counts[bucket])]
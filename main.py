@@ -1,128 +1,307 @@
-import typing
-import tkinter as tk
 import time
-import pygame
+
+# Taken before anything else is imported so the startup report covers imports too
+STARTUP_TIME = time.perf_counter()
+
+import argparse
+import getpass
+import queue
 import sys
+import typing
+import tkinter as tk
 from tkinter import ttk
 
+import session
+from corpora import CorpusCache, LoadedCorpus
+from ghost import Ghost
+from levels import LEVELS, DEFAULT_LEVEL
+from instrument import LatencyProbe
+import metrics
+from metrics import MetricsServer, MetricsSnapshot
+from keylog import KeyLog
+from overlay import ResultScreen
+from passage import PassageView, load_passage
+from practice import AdaptivePicker, KeyStats
+from race import RaceClient
+from scoreboard import Scoreboard
+from scheduler import RefreshScheduler
+from session import PassageSession, TypingSession
+from view import LabelView
+
+# Modifier bit Tk sets in event.state while Control is held
+CONTROL_MASK = 0x4
+
+# How often race mode checks for messages from the server
+RACE_POLL_MS = 50
+
+# How often the metrics endpoint's snapshot is replaced
+METRICS_INTERVAL_MS = 1000
+
+# Keys that would move the Entry's insertion cursor away from the session's
+CURSOR_KEYS = frozenset(("Left", "Right", "Up", "Down", "Home", "End", "Delete", "Prior", "Next"))
+
 
 """
 FastTypeGame
 
 This class creates a typing game where the user can test their typing speed and accuracy.
+The scoring itself lives in session.TypingSession; this class is the Tk view over it.
 
 Attributes:
     window (tk.Tk): Tkinter window object
-    words (typing.List[str]): List of words to type
-    word_index (int): Index of the word to type
+    corpora (typing.List[str]): Word lists the player can pick from between rounds
+    corpus_cache (CorpusCache): Loaded word lists with their samplers and indexes, prefetched in the background
+    corpus_path (tk.StringVar): Word list selected for the next round
+    loaded (LoadedCorpus): The word list in use
+    words (corpus.CompiledCorpus): Compiled word list with per-word metadata
     time_limit (int): Time limit of the game (in seconds)
-    start_time (float): Time when the game started
-    elapsed_time (float): Time elapsed since the game started
-    wpm (float): User's words per minute
-    accuracy (float): User's accuracy
-    typed_words (int): Number of words typed
-    correct_words (int): Number of words typed correctly
-    incorrect_words (int): Number of words typed incorrectly
-    typed_characters (int): Number of characters typed
-    correct_characters (int): Number of characters typed correctly
-    incorrect_characters (int): Number of characters typed incorrectly
-    word_length (int): Length of the current word
-    max_len (int): Maximum length of the words list
-    word_label (tk.Label): Label for the current word
+    sampler (WordSampler): Draws words for the selected difficulty level
+    level (tk.StringVar): Difficulty level, applied when the next round starts
+    key_stats (KeyStats): Per-key and per-bigram error and latency totals for this player
+    practice (AdaptivePicker): Mixes words with the player's weakest bigrams into the level's draws
+    user (str): Player name the scores are saved under
+    mode (str): Game mode the scores are saved under
+    scoreboard (Scoreboard): Saved scores, written in the background
+    keylog (typing.Optional[KeyLog]): Binary log of every key of the round, None when logging is off
+    probe (typing.Optional[LatencyProbe]): Input-to-render latency histograms, None unless instrumented
+    metrics (typing.Optional[MetricsServer]): Localhost metrics endpoint, None unless enabled
+    keystrokes (int): Keys handled since the game started
+    games_ended (int): Rounds that reached the game over screen
+    race (typing.Optional[RaceClient]): Connection to a race server, None when playing alone
+    session (TypingSession): Score state of the current round, a PassageSession in passage mode
+    word_label (tk.Label): Label for the current word, not shown in passage mode
+    passage_text (tk.Text): The passage being typed, only in passage mode
+    passage_view (typing.Optional[PassageView]): Tags passage_text as keys are typed, None outside passage mode
     input_field (tk.Entry): Input field for user to type in
     timer_label (tk.Label): Label for the timer
+    ghost_label (tk.Label): Ghost's WPM and the player's lead over it, shown while racing a ghost
+    ghost (typing.Optional[Ghost]): Recorded best round being raced, None when there is none
     wpm_label (tk.Label): Label for the words per minute
     accuracy_label (tk.Label): Label for the accuracy
     typed_characters_label (tk.Label): Label for the typed characters
     correct_characters_label (tk.Label): Label for the correct characters
     incorrect_characters_label (tk.Label): Label for the incorrect characters
+    standings_label (tk.Label): Race leaders, only shown in race mode
+    view (LabelView): Configures the labels above only when their values change, counting Tk calls per tick
+    startup_time (float): Seconds from importing main.py to the first painted frame
+    refresh (RefreshScheduler): Single after() chain that drives update_ui
+    result_screen (ResultScreen): pygame pause/game over screen pumped from the Tk loop
 
 Methods:
-    __init__(self) -> None
-        Initializes the window, loads words and calls init_ui()
+    __init__(self, startup_report: bool = False, level: str = DEFAULT_LEVEL, practice_rate: float = 0.5,
+             user: typing.Optional[str] = None, scores: str = "scores.db",
+             log_dir: typing.Optional[str] = "logs", latency_report: typing.Optional[str] = None,
+             race: typing.Optional[str] = None, passage: typing.Optional[str] = None, time_limit: int = 20,
+             corpora: typing.Optional[typing.Sequence[str]] = None, corpus_cache_mb: int = 256,
+             ghost: bool = False, metrics_port: typing.Optional[int] = None, on_ready: typing.Optional[typing.Callable[["FastTypeGame"], None]] = None) -> None
+        Initializes the window, loads words, calls init_ui() and on_ready (e.g. to attach a
+        typist.SyntheticTypist) and runs the Tk main loop
 
-    load_words(self) -> None
-        Loads words from words.txt file and adds them to the words list
+    on_first_frame(self) -> None
+        Records (and optionally prints) the import-to-first-frame time
 
-    init_ui(self) -> None
-        Sets up the UI elements and starts the game
+    load_words(self) -> bool
+        Switches to the selected word list (from the cache when it can) and returns whether it changed
 
-    start_game(self) -> None
-        Resets all the variables and starts the game
+    load_ghost(self) -> None
+        Loads the player's best recorded round for the mode and level as the ghost to race
 
-    new_word(self) -> None
-        Gets a new word from the words list and updates the UI
+    publish_metrics(self) -> None
+        Replaces the metrics endpoint's snapshot, every METRICS_INTERVAL_MS
 
-    check_word(self) -> None
-        Checks if the word typed is correct and updates the UI
+    next_corpus(self) -> str
+        The word list the next round will most likely use, to prefetch it
 
-    calculate_wpm(self) -> float
-        Calculates the words per minute
+    init_ui(self) -> None
+        Sets up the UI elements and starts the game
 
-    calculate_accuracy(self) -> float
-        Calculates the accuracy of the user
+    start_game(self, elapsed: float = 0) -> None
+        Applies the selected level, resets the session and starts the game, `elapsed` seconds in
 
-    on_key_pressed(self, event: tk.Event) -> None
-        Checks for key presses and updates the UI
+    poll_race(self) -> None
+        Applies round starts and standings from the race server, every RACE_POLL_MS
+
+    new_word(self) -> None
+        Shows the session's current word and clears the input field
 
-    check_character(self) -> None
-        Checks if the character typed is correct and updates the UI
+    on_key_pressed(self, event: tk.Event) -> typing.Optional[str]
+        Feeds key presses to the session and marks the UI dirty
 
     update_ui(self) -> None
-        Updates the UI elements
+        Pushes the session's score to the labels through the view, called once per tick by the refresh scheduler
+
+    toggle_pause(self) -> None
+        Pauses or resumes the game (Ctrl+P)
 
     pause_game(self) -> None
         Pauses the game and shows the game paused screen
 
+    resume_game(self) -> None
+        Hides the game paused screen and restarts the clock
+
     end_game(self) -> None
-        Ends the game and shows the game over screen
+        Ends the game, queues the score for saving and shows the game over screen
+
+    dump_latency(self) -> None
+        Writes the latency report, with the view's Tk call counts, to the --latency-report file
+
+    quit_game(self) -> None
+        Closes the result screen and the game window
 """
 
 class FastTypeGame:
-    def __init__(self) -> None:
-        
+    def __init__(self, startup_report: bool = False, level: str = DEFAULT_LEVEL,
+                 practice_rate: float = 0.5, user: typing.Optional[str] = None,
+                 scores: str = "scores.db", log_dir: typing.Optional[str] = "logs",
+                 latency_report: typing.Optional[str] = None, race: typing.Optional[str] = None,
+                 passage: typing.Optional[str] = None, time_limit: int = 20,
+                 corpora: typing.Optional[typing.Sequence[str]] = None, corpus_cache_mb: int = 256,
+                 ghost: bool = False, metrics_port: typing.Optional[int] = None,
+                 on_ready: typing.Optional[typing.Callable[["FastTypeGame"], None]] = None) -> None:
+
         # Setup window
         self.window = tk.Tk()
         self.window.title("Fast Type Game")
         self.window.geometry("500x1000")
-        
+
         # Setup variables
-        self.words: typing.List[str] = []
-        self.word_index: int = 0
-        self.time_limit: int = 0
-        self.start_time: float = 0
-        self.elapsed_time: float = 0
-        self.wpm: float = 0
-        self.accuracy: float = 0
-        self.typed_words: int = 0
-        self.correct_words: int = 0
-        self.incorrect_words: int = 0
-        self.typed_characters: int = 0
-        self.correct_characters: int = 0
-        self.incorrect_characters: int = 0
-        self.word_length: int = 0
-        self.load_words()
+        self.time_limit: int = time_limit
+        self.corpora = list(corpora or ["words.txt"])
+        self.corpus_cache = CorpusCache(corpus_cache_mb << 20)
+        self.corpus_path = tk.StringVar(self.window, value=self.corpora[0])
+        self.level = tk.StringVar(self.window, value=level)
+        self.key_stats = KeyStats()
+        self.practice_rate = practice_rate
+        self.loaded: typing.Optional[LoadedCorpus] = None
+        try:
+            self.load_words()
+        except (OSError, ValueError) as error:
+            self.window.destroy()
+            sys.exit(f"Unable to load {self.corpus_path.get()}: {error}")
+        self.user = user or getpass.getuser()
+        if passage:
+            self.session = PassageSession(load_passage(passage), self.time_limit, stats=self.key_stats)
+            self.mode = "passage"
+        else:
+            self.session = TypingSession(self.words, self.time_limit, picker=self.practice, stats=self.key_stats)
+            self.mode = "words"
+        self.scoreboard = Scoreboard(scores)
+        self.keylog = KeyLog(log_dir) if log_dir else None
+        self.probe = LatencyProbe(latency_report) if latency_report else None
+        self.race = RaceClient(race, self.user) if race else None
+        self.ghost_enabled = ghost and self.keylog is not None
+        self.ghost: typing.Optional[Ghost] = None
+        self.keystrokes: int = 0
+        self.games_ended: int = 0
+        self.metrics = metrics.start(metrics_port, {"user": self.user}) if metrics_port is not None else None
+        # (time, keystrokes, refresh ticks) at the last publish, for the per-second rates
+        self._metrics_sample = (time.perf_counter(), 0, 0)
+        if self.race is not None:
+            self.mode = "race"
         self.init_ui()
+        self.startup_time: float = 0
+        self.startup_report = startup_report
+        self.window.after_idle(self.on_first_frame)
+        if on_ready is not None:
+            on_ready(self)
         self.window.mainloop()
 
-    def load_words(self) -> None:
-        with open("words.txt", "r") as f:
-            self.words = f.read().splitlines()
+    def on_first_frame(self) -> None:
+        # Flush pending redraws so the measurement ends once the window is painted
+        self.window.update_idletasks()
+        self.startup_time = time.perf_counter() - STARTUP_TIME
+        if self.startup_report:
+            print(f"Startup: {self.startup_time * 1000:.1f} ms from import to first frame", file=sys.stderr)
+
+    def load_words(self) -> bool:
+        loaded = self.corpus_cache.get(self.corpus_path.get())
+        if loaded is self.loaded:
+            return False
+        self.loaded = loaded
+        self.words = loaded.words
+        self.sampler = loaded.sampler
+        self.practice = AdaptivePicker(self.key_stats, loaded.index, self.sampler, rate=self.practice_rate,
+                                       allowed=self.sampler.allows)
+        return True
+
+    def load_ghost(self) -> None:
+        path = self.scoreboard.best_log(self.mode, self.sampler.level, self.user)
+        if path is None or self.ghost is None or self.ghost.path != path:
+            try:
+                self.ghost = Ghost.from_log(path) if path is not None else None
+            except (OSError, ValueError) as error:
+                print(f"Unable to load ghost {path}: {error}", file=sys.stderr)
+                self.ghost = None
+        if self.ghost is not None:
+            self.ghost_label.pack(after=self.timer_label, pady=(0, 20))
+        else:
+            self.ghost_label.pack_forget()
+
+    def publish_metrics(self) -> None:
+        now = time.perf_counter()
+        sampled, keystrokes, ticks = self._metrics_sample
+        interval = now - sampled or 1
+        typing_session = self.session
+        if typing_session.paused:
+            score = typing_session.snapshot(typing_session.paused_at)
+        else:
+            score = typing_session.snapshot(min(now, typing_session.start_time + self.time_limit))
+        self.metrics.publish(MetricsSnapshot(
+            timestamp=time.time(),
+            sessions_active=int(not typing_session.finished and not typing_session.paused),
+            keystrokes_total=self.keystrokes,
+            keystrokes_per_second=(self.keystrokes - keystrokes) / interval,
+            wpm=score.wpm,
+            accuracy=score.accuracy,
+            refresh_ticks_total=self.refresh.ticks,
+            refresh_ticks_per_second=(self.refresh.ticks - ticks) / interval,
+            refresh_lag_seconds=self.refresh.lag,
+            refresh_max_lag_seconds=self.refresh.max_lag,
+            refresh_pending_callbacks=self.refresh.pending_callbacks,
+            tk_calls_total=self.view.total_calls,
+            games_ended_total=self.games_ended,
+        ))
+        self._metrics_sample = (now, self.keystrokes, self.refresh.ticks)
+        self.window.after(METRICS_INTERVAL_MS, self.publish_metrics)
+
+    def next_corpus(self) -> str:
+        selected = self.corpus_path.get()
+        if selected != self.loaded.path:
+            return selected
+        # Players tend to work through their lists in order
+        return self.corpora[(self.corpora.index(selected) + 1) % len(self.corpora)]
 
     def init_ui(self) -> None:
         # Setup UI
         # self.background_image = tk.PhotoImage(file="background\\background.png")
         # self.background_label = tk.Label(self.window, image=self.background_image)
         # self.background_label.place(x=0, y=0, relwidth=1, relheight=1)
-        
+
         self.game_name_label = tk.Label(self.window, text="💻 TapType Game 💻", font=("Helvetica", 37))
         self.game_name_label.pack(pady=30)
 
+        self.level_select = ttk.Combobox(self.window, textvariable=self.level, state="readonly",
+                                         values=[level.name for level in LEVELS], font=("Helvetica", 15))
+        self.level_select.pack(pady=(0, 20))
+
+        if self.mode == "words" and len(self.corpora) > 1:
+            self.corpus_select = ttk.Combobox(self.window, textvariable=self.corpus_path, state="readonly",
+                                              values=self.corpora, font=("Helvetica", 15))
+            self.corpus_select.pack(pady=(0, 20))
+            self.corpus_select.bind("<<ComboboxSelected>>",
+                                    lambda event: self.corpus_cache.prefetch(self.corpus_path.get()))
+
         self.separator = ttk.Separator(self.window, orient='horizontal')
         self.separator.pack(fill='x')
 
         self.word_label = tk.Label(self.window, text="", font=("Helvetica", 35))
-        self.word_label.pack(pady=30)
+        self.passage_view: typing.Optional[PassageView] = None
+        if isinstance(self.session, PassageSession):
+            self.passage_text = tk.Text(self.window, height=8, width=36, wrap="word", font=("Helvetica", 16))
+            self.passage_text.pack(pady=20)
+            self.passage_view = PassageView(self.passage_text)
+        else:
+            self.word_label.pack(pady=30)
 
         self.input_field = tk.Entry(self.window, font=("Helvetica", 25))
         self.input_field.pack(pady=30)
@@ -131,6 +310,9 @@ class FastTypeGame:
         self.timer_label = tk.Label(self.window, text="", font=("Helvetica", 20))
         self.timer_label.pack(pady=30)
 
+        # Packed under the timer once there is a ghost to race
+        self.ghost_label = tk.Label(self.window, text="", font=("Helvetica", 20), fg="#7e57c2")
+
         self.wpm_label = tk.Label(self.window, text="WPM: 0", font=("Helvetica", 25))
         self.wpm_label.pack(pady=30)
 
@@ -146,162 +328,317 @@ class FastTypeGame:
         self.incorrect_characters_label = tk.Label(self.window, text="Incorrect Characters: 0", font=("Helvetica", 20))
         self.incorrect_characters_label.pack(pady=30)
 
+        self.standings_label = tk.Label(self.window, text="", font=("Helvetica", 15), justify="left")
+        if self.race is not None:
+            self.standings_label.pack(pady=10)
+
+        self.view = LabelView()
+        self.view.bind("word", self.word_label)
+        self.view.bind("timer", self.timer_label, "Time: {}")
+        self.view.bind("ghost", self.ghost_label, "Ghost: {0[0]} WPM ({0[1]:+d})")
+        self.view.bind("wpm", self.wpm_label, "WPM: {}")
+        self.view.bind("accuracy", self.accuracy_label, "Accuracy: {}%")
+        self.view.bind("typed_characters", self.typed_characters_label, "Typed Characters: {}")
+        self.view.bind("correct_characters", self.correct_characters_label, "Correct Characters: {}")
+        self.view.bind("incorrect_characters", self.incorrect_characters_label, "Incorrect Characters: {}")
+
+        self.refresh = RefreshScheduler(self.window, self.update_ui)
+        self.result_screen = ResultScreen(self.window)
+        self.window.protocol("WM_DELETE_WINDOW", self.quit_game)
+        if self.probe is not None:
+            self.window.bind("<F12>", lambda event: self.dump_latency())
+        if self.metrics is not None:
+            self.publish_metrics()
+
+        if self.race is not None:
+            # Rounds start when the server says so
+            self.level_select.configure(state="disabled")
+            self.session.finished = True
+            self.view.set("word", "Waiting for race...")
+            self.window.after(RACE_POLL_MS, self.poll_race)
+            return
+
         # Start game
         self.start_game()
 
-    def start_game(self) -> None:
-        self.start_time = time.time()
-        self.elapsed_time = 0
-        self.wpm = 0
-        self.accuracy = 0
-        self.typed_words = 0
-        self.correct_words = 0
-        self.incorrect_words = 0
-        self.correct_characters = 0
-        self.incorrect_characters = 0
-        self.word_index = 0
-        self.max_len = len(self.words)
+    def start_game(self, elapsed: float = 0) -> None:
+        if self.mode == "words":
+            try:
+                if self.load_words():
+                    self.session = TypingSession(self.words, self.time_limit, picker=self.practice,
+                                                 stats=self.key_stats)
+            except (OSError, ValueError) as error:
+                print(f"Unable to load {self.corpus_path.get()}: {error}", file=sys.stderr)
+                self.corpus_path.set(self.loaded.path)
+        self.sampler.set_level(self.level.get())
+        if self.ghost_enabled:
+            self.load_ghost()
+        self.session.time_limit = self.time_limit
+        now_ns = time.perf_counter_ns()
+        self.session.start(now_ns / 1e9 - elapsed)
+        if self.passage_view is not None:
+            self.passage_view.load(self.session)
+        if self.keylog is not None:
+            # Joining a race mid-round, the log still starts when the round did
+            self.keylog.start({"user": self.user, "mode": self.mode, "level": self.sampler.level,
+                               "time_limit": self.time_limit}, now_ns - int(elapsed * 1e9))
         self.new_word()
-        self.word_length = len(self.words[self.word_index])
-        # Set time limit
-        self.time_limit = 20
-        self.update_ui()
+        self.refresh.start()
+
+    def poll_race(self) -> None:
+        while True:
+            try:
+                message = self.race.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if message["type"] == "round":
+                self.refresh.stop()
+                if self.keylog is not None:
+                    self.keylog.finish()
+                # Everyone types the same words in the same order, scored like the server does
+                self.time_limit = message["time_limit"]
+                self.session = TypingSession(message["words"], self.time_limit)
+                if any(level.name == message["level"] for level in LEVELS):
+                    self.level.set(message["level"])
+                self.result_screen.hide()
+                self.input_field.focus_set()
+                self.start_game(elapsed=message["elapsed"])
+            elif message["type"] == "standings":
+                lines = [f"{rank}. {name}  {int(wpm)} WPM  {int(accuracy)}%"
+                         for rank, (name, wpm, accuracy, _) in enumerate(message["top"][:3], 1)]
+                lines.append(f"{message['players']} racing")
+                self.standings_label.configure(text="\n".join(lines))
+            elif message["type"] == "error":
+                self.standings_label.configure(text=message["message"])
+        self.window.after(RACE_POLL_MS, self.poll_race)
 
     def new_word(self) -> None:
-        self.word_label.configure(text=self.words[self.word_index])
+        self.view.set("word", self.session.current_word)
         self.input_field.delete(0, tk.END)
-        self.word_length = len(self.words[self.word_index])
 
-    def check_word(self) -> None:
-        self.typed_words += 1
-        if self.input_field.get() == self.words[self.word_index]:
-            self.correct_words += 1
-        else:
-            self.incorrect_words += 1
-
-        self.word_index += 1
-
-        if self.word_index >= len(self.words):
+    def on_key_pressed(self, event: tk.Event) -> typing.Optional[str]:
+        now_ns = time.perf_counter_ns()
+        self.keystrokes += 1
+        if event.keysym == "F12" and self.probe is not None:
+            # The window's F12 binding never sees keys this handler breaks, so catch it here
+            self.dump_latency()
+            return "break"
+        if event.state & CONTROL_MASK:
+            if event.keysym == "p":
+                self.toggle_pause()
+            return "break"
+        if self.session.finished or self.session.paused:
+            return "break"
+        if event.keysym in CURSOR_KEYS:
+            # The session tracks the cursor itself, so keep the Entry's in step
+            if self.keylog is not None:
+                self.keylog.append(event.keysym_num, session.IGNORED, now_ns)
+            return "break"
+        result = self.session.on_key(event.keysym, now_ns / 1e9, event.char)
+        if self.probe is not None:
+            self.probe.key_scored(now_ns)
+        if self.keylog is not None:
+            self.keylog.append(event.keysym_num, result, now_ns)
+        if self.race is not None and result != session.IGNORED:
+            # Send the typed character itself, which the server reads as its own keysym,
+            # so keys without an ASCII keysym are scored there too
+            char = session.key_char(event.keysym, event.char)
+            self.race.send_key(char or event.keysym, now_ns / 1e9 - self.session.start_time)
+        if self.passage_view is not None:
+            self.passage_view.key_handled()
+        if self.session.finished:
+            # Escape, or the last character of a passage
+            self.refresh.stop()
             self.end_game()
-        else:
+        elif result == session.WORD_CORRECT or result == session.WORD_INCORRECT:
             self.new_word()
+        self.refresh.mark_dirty()
+        # The passage is typed over in the Text widget, so keep the Entry from filling up with it
+        return "break" if self.passage_view is not None else None
 
-    def calculate_wpm(self) -> float:
-        if self.elapsed_time > 0:
-            self.wpm = (self.typed_characters / 5) / self.elapsed_time * 60
-        return self.wpm
-
-    def calculate_accuracy(self) -> float:
-        if self.typed_characters > 0:
-            self.accuracy = (self.correct_characters / self.typed_characters) * 100
-        return self.accuracy
-
-    def on_key_pressed(self, event: tk.Event) -> None:
-        if event.keysym == "Return":
-            self.check_word()
-            self.new_word()
-        elif event.keysym == "BackSpace":
-            self.typed_characters += 1
-            self.incorrect_characters += 1
-        elif event.keysym == "Escape":
-            self.end_game()
-        else:
-            self.typed_characters += 1
-            self.check_character()
-        self.update_ui()
-
-    def check_character(self) -> None:
-        typed_word = self.input_field.get()
-        generated_word = self.words[self.word_index]
-        if typed_word == generated_word[:len(typed_word)]:
-            self.correct_characters += 1
+    def toggle_pause(self) -> None:
+        if self.session.paused:
+            self.resume_game()
         else:
-            self.incorrect_characters += 1
+            self.pause_game()
 
     def update_ui(self) -> None:
-        self.wpm = self.calculate_wpm()
-        self.accuracy = self.calculate_accuracy()
-        self.elapsed_time = time.time() - self.start_time
-
-        self.timer_label.configure(text=f"Time: {int(self.time_limit - self.elapsed_time)}")
-        self.wpm_label.configure(text=f"WPM: {int(self.wpm)}")
-        self.accuracy_label.configure(text=f"Accuracy: {int(self.accuracy)}%")
-        self.typed_characters_label.configure(text=f"Typed Characters: {int(self.typed_characters)}")
-        self.correct_characters_label.configure(text=f"Correct Characters: {int(self.correct_characters)}")
-        self.incorrect_characters_label.configure(text=f"Incorrect Characters: {int(self.incorrect_characters)}")
-
-        if self.elapsed_time > self.time_limit:
+        if self.probe is not None:
+            started_ns = time.perf_counter_ns()
+        now = time.perf_counter()
+        score = self.session.snapshot(now)
+
+        # Only the labels whose value moved are configured
+        self.view.set("timer", int(self.time_limit - score.elapsed_time))
+        self.view.set("wpm", int(score.wpm))
+        self.view.set("accuracy", int(score.accuracy))
+        self.view.set("typed_characters", int(score.typed_characters))
+        self.view.set("correct_characters", int(score.correct_characters))
+        self.view.set("incorrect_characters", int(score.incorrect_characters))
+        if self.ghost is not None:
+            # Two bisects over the recorded round, whatever its length
+            elapsed = min(score.elapsed_time, self.time_limit)
+            self.view.set("ghost", (int(self.ghost.wpm_at(elapsed)),
+                                    score.correct_characters - self.ghost.correct_at(elapsed)))
+        if self.passage_view is not None:
+            self.view.count(self.passage_view.refresh())
+        self.view.end_tick()
+
+        if self.probe is not None:
+            self.probe.ui_updated(started_ns)
+            # Runs after the redraw the configure calls above queued
+            self.window.after_idle(self.probe.frame_rendered)
+
+        if self.session.expired(now):
+            self.refresh.stop()
             self.end_game()
-        self.window.after(100, self.update_ui)
 
     def pause_game(self) -> None:
-        self.elapsed_time = time.time() - self.start_time
-        self.wpm = self.calculate_wpm()
-        self.accuracy = self.calculate_accuracy()
-        self.wpm_label.configure(text=f"WPM: {int(self.wpm)}")
-        self.accuracy_label.configure(text=f"Accuracy: {int(self.accuracy)}%")
-        self.word_label.configure(text="Game Paused")
-        # Show game over screen
-        pygame.init()
-        game_paused_screen = pygame.display.set_mode((500, 500))
-        pygame.display.set_caption("Game Paused")
-
-        font = pygame.font.Font("freesansbold.ttf", 24)
-        text = font.render(f"WPM: {int(self.wpm)}", True, (255, 255, 255))
-        text_rect = text.get_rect()
-        text_rect.center = (250, 250)
-        game_paused_screen.blit(text, text_rect)
-
-        text = font.render(f"Accuracy: {int(self.accuracy)}%", True, (255, 255, 255))
-        text_rect = text.get_rect()
-        text_rect.center = (250, 300)
-        game_paused_screen.blit(text, text_rect)
-
-        pygame.display.update()
-
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN and event.keysym == "p":
-                    self.start_time = time.time() - self.elapsed_time
-                    self.new_word()
-                    break
+        # A race runs on the server's clock, which doesn't stop
+        if self.session.finished or self.session.paused or self.race is not None:
+            return
+        now_ns = time.perf_counter_ns()
+        now = now_ns / 1e9
+        self.session.pause(now)
+        if self.keylog is not None:
+            # The next record's delta is the paused time, which scoring leaves out
+            self.keylog.append(0, session.PAUSE, now_ns)
+        self.refresh.stop()
+        score = self.session.snapshot(now)
+        self.view.set("wpm", int(score.wpm))
+        self.view.set("accuracy", int(score.accuracy))
+        self.view.set("word", "Game Paused")
+        # Show game paused screen
+        self.result_screen.show(
+            "Game Paused",
+            [f"WPM: {int(score.wpm)}", f"Accuracy: {int(score.accuracy)}%", "Press P to resume"],
+            self.on_paused_key,
+            self.quit_game,
+        )
+        if self.probe is not None:
+            self.window.after_idle(self.probe.frame_rendered)
+
+    def on_paused_key(self, key: str) -> None:
+        if key == "p":
+            self.resume_game()
+        elif key == "f12" and self.probe is not None:
+            self.dump_latency()
+
+    def resume_game(self) -> None:
+        if not self.session.paused:
+            return
+        self.result_screen.hide()
+        now_ns = time.perf_counter_ns()
+        self.session.resume(now_ns / 1e9)
+        if self.keylog is not None:
+            self.keylog.append(0, session.RESUME, now_ns)
+        self.view.set("word", self.session.current_word)
+        self.input_field.focus_set()
+        self.refresh.start()
 
     def end_game(self) -> None:
-        self.wpm = self.calculate_wpm()
-        self.accuracy = self.calculate_accuracy()
-        self.wpm_label.configure(text=f"WPM: {int(self.wpm)}")
-        self.accuracy_label.configure(text=f"Accuracy: {int(self.accuracy)}%")
-        self.word_label.configure(text="Game Over")
+        self.session.finished = True
+        self.games_ended += 1
+        if self.passage_view is not None:
+            self.passage_view.refresh()
+        log_path = None
+        if self.keylog is not None:
+            # Mark where the round ended so the log can be rescored on its own
+            log_path = self.keylog.path
+            self.keylog.append(0, session.END, time.perf_counter_ns())
+            self.keylog.finish()
+        score = self.session.snapshot(time.perf_counter())
+        level = self.sampler.level
+        if self.mode == "words" and len(self.corpora) > 1:
+            # Load the next round's word list while the player looks at the result
+            self.corpus_cache.prefetch(self.next_corpus())
+        best = self.scoreboard.best(self.mode, level, self.user)
+        best_wpm = max(score.wpm, best.wpm) if best is not None else score.wpm
+        self.scoreboard.submit(self.user, self.mode, level, score.wpm, score.accuracy,
+                               score.typed_characters, min(score.elapsed_time, self.time_limit), log_path=log_path)
+        self.view.set("wpm", int(score.wpm))
+        self.view.set("accuracy", int(score.accuracy))
+        self.view.set("word", "Game Over")
         # Show game over screen
-        pygame.init()
-        game_over_screen = pygame.display.set_mode((500, 500))
-        pygame.display.set_caption("Game Over")
-
-        font = pygame.font.Font("freesansbold.ttf", 24)
-        text = font.render(f"WPM: {int(self.wpm)}", True, (255, 255, 255))
-        text_rect = text.get_rect()
-        text_rect.center = (250, 250)
-        game_over_screen.blit(text, text_rect)
-
-        text = font.render(f"Accuracy: {int(self.accuracy)}%", True, (255, 255, 255))
-        text_rect = text.get_rect()
-        text_rect.center = (250, 300)
-        game_over_screen.blit(text, text_rect)
-
-        pygame.display.update()
-
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    self.start_game()
-                    break
+        self.result_screen.show(
+            "Game Over",
+            [f"WPM: {int(score.wpm)}", f"Accuracy: {int(score.accuracy)}%",
+             f"Best ({level}): {int(best_wpm)} WPM",
+             "Next race starts soon, ESC to quit" if self.race is not None else "Press ESC to quit"],
+            self.on_game_over_key,
+            self.quit_game,
+        )
+        if self.probe is not None:
+            # The key that ended the round is drawn by this repaint, not the next round's first tick
+            self.window.after_idle(self.probe.frame_rendered)
+
+    def on_game_over_key(self, key: str) -> None:
+        if key == "escape":
+            self.quit_game()
+        elif key == "f12" and self.probe is not None:
+            self.dump_latency()
+        elif self.race is None:
+            self.result_screen.hide()
+            self.input_field.focus_set()
+            self.start_game()
+
+    def dump_latency(self) -> None:
+        self.probe.dump({"tk_calls": self.view.stats(), "refresh": self.refresh.stats()})
+
+    def quit_game(self) -> None:
+        self.refresh.stop()
+        self.result_screen.close()
+        self.scoreboard.close()
+        self.corpus_cache.close()
+        if self.metrics is not None:
+            self.metrics.close()
+        if self.probe is not None:
+            self.dump_latency()
+        if self.keylog is not None:
+            self.keylog.close()
+        if self.race is not None:
+            self.race.close()
+        self.window.destroy()
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TapType - a typing speed and accuracy game.")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print the time from import to the first painted frame")
+    parser.add_argument("--level", choices=[level.name for level in LEVELS], default=DEFAULT_LEVEL,
+                        help="difficulty level of the first round")
+    parser.add_argument("--practice-rate", type=float, default=0.5,
+                        help="share of words picked to practise your weakest letter pairs (0 disables)")
+    parser.add_argument("--user", help="name to save scores under (defaults to the login name)")
+    parser.add_argument("--scores", default="scores.db", help="SQLite file the scoreboard is kept in")
+    parser.add_argument("--log-dir", default="logs", help="directory for the per-round keystroke logs")
+    parser.add_argument("--no-log", action="store_true", help="don't record keystroke logs")
+    parser.add_argument("--latency-report", metavar="FILE",
+                        help="measure input-to-render latency and write it as JSON to FILE on exit or F12")
+    parser.add_argument("--corpus", dest="corpora", action="append", metavar="FILE",
+                        help="word list to play (repeat to choose between several each round; default words.txt)")
+    parser.add_argument("--corpus-cache-mb", type=int, default=256,
+                        help="memory kept for loaded word lists before the least recently used are dropped")
+    parser.add_argument("--ghost", action="store_true",
+                        help="race a ghost of your best recorded round for the mode and level (needs key logs)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus-style metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--time-limit", type=int, default=20, help="length of a round in seconds")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--race", metavar="ADDRESS",
+                        help="join the race server at HOST:PORT or unix:PATH instead of playing alone")
+    source.add_argument("--passage", metavar="FILE",
+                        help="type the whole text of FILE (a book chapter, source code...) instead of single words")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace,
+        on_ready: typing.Optional[typing.Callable[[FastTypeGame], None]] = None) -> FastTypeGame:
+    return FastTypeGame(startup_report=args.startup_report, level=args.level, practice_rate=args.practice_rate,
+                        user=args.user, scores=args.scores, log_dir=None if args.no_log else args.log_dir,
+                        latency_report=args.latency_report, race=args.race, passage=args.passage,
+                        time_limit=args.time_limit, corpora=args.corpora, corpus_cache_mb=args.corpus_cache_mb,
+                        ghost=args.ghost, metrics_port=args.metrics_port, on_ready=on_ready)
 
 
 if __name__ == "__main__":
-    game = FastTypeGame()
+    game = run(parse_args())
@@ -0,0 +1,133 @@
+import http.server
+import os
+import sys
+import threading
+import time
+import typing
+
+
+"""
+Metrics endpoint
+
+Serves Prometheus-style text metrics for one running game on localhost from a
+background thread. The game publishes a MetricsSnapshot from the Tk thread
+once a second by replacing a single attribute, and the HTTP thread only ever
+reads that attribute, so a scrape never takes a lock or touches game state.
+
+Usage:
+    python main.py --metrics-port 9464
+    curl http://127.0.0.1:9464/metrics
+"""
+
+PREFIX = "taptype_"
+
+
+class MetricsSnapshot(typing.NamedTuple):
+    timestamp: float
+    sessions_active: int
+    keystrokes_total: int
+    keystrokes_per_second: float
+    wpm: float
+    accuracy: float
+    refresh_ticks_total: int
+    refresh_ticks_per_second: float
+    refresh_lag_seconds: float
+    refresh_max_lag_seconds: float
+    refresh_pending_callbacks: int
+    tk_calls_total: int
+    games_ended_total: int
+
+
+# (field, type, help) in exposition order
+METRICS: typing.Tuple[typing.Tuple[str, str, str], ...] = (
+    ("sessions_active", "gauge", "1 while a round is being played, 0 when paused or over."),
+    ("keystrokes_total", "counter", "Keys handled by the game."),
+    ("keystrokes_per_second", "gauge", "Keys handled per second over the last publish interval."),
+    ("wpm", "gauge", "Words per minute of the current or last round."),
+    ("accuracy", "gauge", "Accuracy in percent of the current or last round."),
+    ("refresh_ticks_total", "counter", "UI refresh ticks run."),
+    ("refresh_ticks_per_second", "gauge", "UI refresh ticks per second over the last publish interval."),
+    ("refresh_lag_seconds", "gauge", "How late the last refresh tick ran after it was due."),
+    ("refresh_max_lag_seconds", "gauge", "Latest a refresh tick has run after it was due."),
+    ("refresh_pending_callbacks", "gauge", "Refresh callbacks scheduled with Tk and not yet run; at most 1."),
+    ("tk_calls_total", "counter", "Tk widget calls made by refresh ticks."),
+    ("games_ended_total", "counter", "Rounds that reached the game over screen."),
+)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(snapshot: MetricsSnapshot, labels: typing.Dict[str, str]) -> str:
+    label_text = ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+    lines = []
+    for field, kind, help_text in METRICS:
+        name = PREFIX + field
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name}{{{label_text}}} {getattr(snapshot, field)}")
+    lines.append(f"# HELP {PREFIX}snapshot_age_seconds Seconds since the game last published its metrics.")
+    lines.append(f"# TYPE {PREFIX}snapshot_age_seconds gauge")
+    lines.append(f"{PREFIX}snapshot_age_seconds{{{label_text}}} {time.time() - snapshot.timestamp:.3f}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        snapshot = self.server.metrics.snapshot
+        if snapshot is None:
+            self.send_error(503, "no metrics published yet")
+            return
+        body = render(snapshot, self.server.metrics.labels).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: typing.Any) -> None:
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    metrics: "MetricsServer"
+
+
+class MetricsServer:
+    """Serves the last published snapshot at http://host:port/metrics."""
+
+    def __init__(self, port: int, host: str = "127.0.0.1",
+                 labels: typing.Optional[typing.Dict[str, str]] = None) -> None:
+        self.labels = dict(labels or {})
+        self.labels.setdefault("pid", str(os.getpid()))
+        # Replaced whole by publish(); never mutated, so readers need no lock
+        self.snapshot: typing.Optional[MetricsSnapshot] = None
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.metrics = self
+        self.address = self._httpd.server_address
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def publish(self, snapshot: MetricsSnapshot) -> None:
+        self.snapshot = snapshot
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+def start(port: int, labels: typing.Optional[typing.Dict[str, str]] = None) -> typing.Optional[MetricsServer]:
+    """Start a MetricsServer, or report why not and return None."""
+    try:
+        return MetricsServer(port, labels=labels)
+    except OSError as error:
+        print(f"Unable to serve metrics on port {port}: {error}", file=sys.stderr)
+        return None
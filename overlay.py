@@ -0,0 +1,119 @@
+import tkinter as tk
+import typing
+
+if typing.TYPE_CHECKING:
+    import pygame
+
+# Rendered text is reused across rounds; bounded so per-round numbers can't grow it forever
+TEXT_CACHE_SIZE = 256
+
+_pygame: typing.Any = None
+
+
+def load_pygame() -> typing.Any:
+    """Import and initialise pygame on first use; later calls are free."""
+    global _pygame
+    if _pygame is None:
+        import pygame
+        pygame.display.init()
+        pygame.font.init()
+        _pygame = pygame
+    return _pygame
+
+
+class ResultScreen:
+    """pygame results window that is pumped from the Tk event loop.
+
+    Instead of spinning in its own `pygame.event.get` loop, the screen polls
+    the pygame queue from a single Tk `after` callback while it is visible,
+    so the Tk mainloop keeps running and the process sleeps between polls.
+    pygame, the display and the font are created on the first `show` and kept
+    for the rest of the process; hiding only iconifies the window.
+    """
+
+    def __init__(self, window: tk.Misc, poll_interval_ms: int = 100) -> None:
+        self.window = window
+        self.poll_interval_ms = poll_interval_ms
+        self.visible: bool = False
+        self.on_key: typing.Callable[[str], None] = lambda key: None
+        self.on_quit: typing.Callable[[], None] = lambda: None
+        self.screen: typing.Optional["pygame.Surface"] = None
+        self.font: typing.Optional["pygame.font.Font"] = None
+        self.text_cache: typing.Dict[str, "pygame.Surface"] = {}
+        self._after_id: typing.Optional[str] = None
+
+    def render_text(self, line: str) -> "pygame.Surface":
+        text = self.text_cache.get(line)
+        if text is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE:
+                self.text_cache.clear()
+            text = self.font.render(line, True, (255, 255, 255))
+            self.text_cache[line] = text
+        return text
+
+    def show(self, caption: str, lines: typing.Sequence[str],
+             on_key: typing.Callable[[str], None], on_quit: typing.Callable[[], None]) -> None:
+        pygame = load_pygame()
+        if self.screen is None or not self.visible:
+            # set_mode reuses the existing window and brings it back up
+            self.screen = pygame.display.set_mode((500, 500))
+            # Only wake up for the events we act on
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN])
+        if self.font is None:
+            self.font = pygame.font.Font("freesansbold.ttf", 24)
+        pygame.display.set_caption(caption)
+
+        self.screen.fill((0, 0, 0))
+        for i, line in enumerate(lines):
+            text = self.render_text(line)
+            text_rect = text.get_rect()
+            text_rect.center = (250, 250 + 50 * i)
+            self.screen.blit(text, text_rect)
+        pygame.display.update()
+
+        self.on_key = on_key
+        self.on_quit = on_quit
+        self.visible = True
+        self._schedule()
+
+    def hide(self) -> None:
+        self._cancel()
+        if self.visible:
+            self.visible = False
+            _pygame.display.iconify()
+
+    def close(self) -> None:
+        global _pygame
+        self._cancel()
+        self.visible = False
+        if _pygame is not None:
+            _pygame.quit()
+            _pygame = None
+        self.screen = None
+        self.font = None
+        self.text_cache.clear()
+
+    def _schedule(self) -> None:
+        if self._after_id is None:
+            self._after_id = self.window.after(self.poll_interval_ms, self._pump)
+
+    def _cancel(self) -> None:
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _pump(self) -> None:
+        self._after_id = None
+        pygame = _pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.close()
+                self.on_quit()
+                return
+            if event.type == pygame.KEYDOWN:
+                self.on_key(pygame.key.name(event.key))
+                if not self.visible:
+                    return
+        if self.visible:
+            self._schedule()
@@ -0,0 +1,134 @@
+import tkinter as tk
+import typing
+
+import session
+from session import PassageSession
+
+
+"""
+Passage view
+
+Shows a PassageSession in a tk.Text widget with the typed characters tagged
+correct or incorrect. Only a window of WINDOW_CHARS characters around the
+cursor is ever inserted into the widget, and each refresh retags only the
+range the keys since the last refresh could have changed, so the cost per key
+doesn't depend on how long the passage is. The window slides forward (or back,
+after BackSpace) once the cursor nears its edge, retagging it from
+PassageSession.status in runs.
+"""
+
+WINDOW_CHARS = 2000
+# Characters of already typed text kept above the cursor when the window slides
+BACK_CONTEXT = 200
+# Slide before the cursor gets this close to the end of the window
+SLIDE_MARGIN = 200
+
+TAGS = {session.CORRECT: "correct", session.INCORRECT: "incorrect"}
+
+
+def load_passage(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    # Typed text has no carriage returns, and a trailing newline would be a key nobody expects
+    text = text.replace("\r\n", "\n").rstrip()
+    if not text:
+        raise ValueError(f"{path} contains no text to type")
+    return text
+
+
+def status_runs(status: bytearray, start: int, end: int) -> typing.Iterator[typing.Tuple[int, int, int]]:
+    """Yield (result, run start, run end) for runs of equal status in [start, end)."""
+    position = start
+    while position < end:
+        value = status[position]
+        run_end = position + 1
+        while run_end < end and status[run_end] == value:
+            run_end += 1
+        yield value, position, run_end
+        position = run_end
+
+
+class PassageView:
+    """Keeps a Text widget in step with a PassageSession, a window at a time."""
+
+    def __init__(self, text: tk.Text) -> None:
+        self.text = text
+        self.text.tag_configure("correct", foreground="#2e7d32")
+        self.text.tag_configure("incorrect", foreground="#c62828", background="#ffcdd2")
+        self.text.tag_configure("cursor", underline=True, background="#fff59d")
+        self.text.configure(state="disabled")
+        self.session: typing.Optional[PassageSession] = None
+        self.window_start: int = 0
+        self.window_end: int = 0
+        # Cursor the tags were last drawn for, and the lowest cursor seen since
+        self.applied: int = 0
+        self.low: int = 0
+        # Tk calls made by the current refresh
+        self.tk_calls: int = 0
+
+    def index(self, position: int) -> str:
+        return f"1.0 + {position - self.window_start} chars"
+
+    def load(self, typing_session: PassageSession) -> None:
+        self.session = typing_session
+        self.show_window(0)
+
+    def show_window(self, start: int) -> None:
+        passage = self.session.passage
+        self.window_start = start
+        self.window_end = min(len(passage), start + WINDOW_CHARS)
+        self.text.configure(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", passage[self.window_start:self.window_end])
+        self.text.configure(state="disabled")
+        self.tk_calls += 4
+        self.retag(self.window_start, min(self.session.cursor, self.window_end), clear=False)
+        self.applied = self.low = self.session.cursor
+        self.move_cursor()
+
+    def key_handled(self) -> None:
+        """Note where the cursor went; call after every key the session scores."""
+        if self.session.cursor < self.low:
+            self.low = self.session.cursor
+
+    def refresh(self) -> int:
+        """Bring the widget up to date with the session, touching only what changed.
+
+        Returns the number of Tk calls it made.
+        """
+        self.tk_calls = 0
+        cursor = self.session.cursor
+        passage_end = len(self.session.passage)
+        if cursor < self.window_start or (cursor > self.window_end - SLIDE_MARGIN and self.window_end < passage_end):
+            self.show_window(max(0, cursor - BACK_CONTEXT))
+            return self.tk_calls
+        low = min(self.low, self.applied)
+        high = max(self.applied, cursor)
+        if low != high:
+            # Characters between the lowest cursor since the last refresh and the furthest one may have changed
+            self.retag(max(low, self.window_start), min(high, self.window_end))
+            self.applied = self.low = cursor
+            self.move_cursor()
+        return self.tk_calls
+
+    def retag(self, start: int, end: int, clear: bool = True) -> None:
+        if start >= end:
+            return
+        if clear:
+            self.text.tag_remove("correct", self.index(start), self.index(end))
+            self.text.tag_remove("incorrect", self.index(start), self.index(end))
+            self.tk_calls += 2
+        for value, run_start, run_end in status_runs(self.session.status, start, end):
+            tag = TAGS.get(value)
+            if tag is not None:
+                self.text.tag_add(tag, self.index(run_start), self.index(run_end))
+                self.tk_calls += 1
+
+    def move_cursor(self) -> None:
+        cursor = self.session.cursor
+        self.text.tag_remove("cursor", "1.0", tk.END)
+        if cursor < self.window_end:
+            self.text.tag_add("cursor", self.index(cursor))
+            self.text.see(self.index(cursor))
+            self.tk_calls += 2
+        self.tk_calls += 1
@@ -0,0 +1,130 @@
+import array
+import random
+import typing
+
+from corpus import ALPHABET, CompiledCorpus
+
+
+"""
+Adaptive practice
+
+KeyStats keeps per-key and per-bigram press, error and latency totals in flat
+arrays indexed by ASCII code (bigram = first * 128 + second), so recording a
+keystroke never allocates. It also maintains a small list of the weakest
+bigrams as they change. BigramIndex is the inverted bigram -> words index
+stored in a compiled corpus, and AdaptivePicker uses both to steer new_word towards
+words that exercise the user's weakest transitions.
+"""
+
+# How many of the weakest bigrams are tracked for word selection
+WEAKEST_COUNT = 8
+# Gaps longer than this are pauses, not typing, and are left out of the latency totals
+MAX_LATENCY = 2.0
+# Seconds of mean latency that weigh as much as a 100% error rate
+LATENCY_SCALE = 1.0
+# Practice words drawn per pick looking for one the current level allows
+PRACTICE_ATTEMPTS = 8
+
+
+def char_code(char: str) -> int:
+    code = ord(char)
+    return code if code < ALPHABET else 0
+
+
+class KeyStats:
+    """Fixed-size per-key and per-bigram accumulators."""
+
+    def __init__(self) -> None:
+        self.key_presses = array.array("I", bytes(4 * ALPHABET))
+        self.key_errors = array.array("I", bytes(4 * ALPHABET))
+        self.key_latency = array.array("d", bytes(8 * ALPHABET))
+        self.bigram_presses = array.array("I", bytes(4 * ALPHABET * ALPHABET))
+        self.bigram_errors = array.array("I", bytes(4 * ALPHABET * ALPHABET))
+        self.bigram_latency = array.array("d", bytes(8 * ALPHABET * ALPHABET))
+        self.weakest: typing.List[int] = []
+        self.weakest_scores: typing.List[float] = []
+
+    def record(self, previous: str, expected: str, correct: bool, latency: float) -> None:
+        """Record an attempt at `expected` that followed `previous` (empty at the start of a word)."""
+        key = char_code(expected)
+        self.key_presses[key] += 1
+        if not correct:
+            self.key_errors[key] += 1
+        timed = 0 < latency < MAX_LATENCY
+        if timed:
+            self.key_latency[key] += latency
+        if not previous:
+            return
+        bigram = char_code(previous) * ALPHABET + key
+        self.bigram_presses[bigram] += 1
+        if not correct:
+            self.bigram_errors[bigram] += 1
+        if timed:
+            self.bigram_latency[bigram] += latency
+        self.update_weakest(bigram, self.bigram_weakness(bigram))
+
+    def bigram_weakness(self, bigram: int) -> float:
+        presses = self.bigram_presses[bigram]
+        error_rate = (self.bigram_errors[bigram] + 1) / (presses + 2)
+        return error_rate + self.bigram_latency[bigram] / presses / LATENCY_SCALE
+
+    def update_weakest(self, bigram: int, score: float) -> None:
+        weakest = self.weakest
+        scores = self.weakest_scores
+        for i, tracked in enumerate(weakest):
+            if tracked == bigram:
+                scores[i] = score
+                return
+        if len(weakest) < WEAKEST_COUNT:
+            weakest.append(bigram)
+            scores.append(score)
+            return
+        lowest = min(range(WEAKEST_COUNT), key=scores.__getitem__)
+        if score > scores[lowest]:
+            weakest[lowest] = bigram
+            scores[lowest] = score
+
+
+class BigramIndex:
+    """Inverted index from bigram to the corpus words that contain it."""
+
+    def __init__(self, corpus: CompiledCorpus) -> None:
+        # Built by compile_corpus and mapped with the rest of the corpus
+        self.starts = corpus.bigram_starts
+        self.postings = corpus.bigram_postings
+
+    def word_count(self, bigram: int) -> int:
+        return self.starts[bigram + 1] - self.starts[bigram]
+
+    def word(self, bigram: int, n: int) -> int:
+        return self.postings[self.starts[bigram] + n]
+
+
+class AdaptivePicker:
+    """Word picker that mixes practice words for weak bigrams into another picker's draws.
+
+    With `allowed`, practice words are rejection-sampled against it (e.g. the
+    current level's buckets), falling back to the other picker if none fits.
+    """
+
+    def __init__(self, stats: KeyStats, index: BigramIndex, fallback: typing.Callable[[], int],
+                 rate: float = 0.5, rng: typing.Optional[random.Random] = None,
+                 allowed: typing.Optional[typing.Callable[[int], bool]] = None) -> None:
+        self.stats = stats
+        self.index = index
+        self.fallback = fallback
+        self.rate = rate
+        self.random = rng or random.Random()
+        self.allowed = allowed
+
+    def __call__(self) -> int:
+        weakest = self.stats.weakest
+        if weakest and self.random.random() < self.rate:
+            bigram = weakest[self.random.randrange(len(weakest))]
+            count = self.index.word_count(bigram)
+            if count:
+                for _ in range(PRACTICE_ATTEMPTS):
+                    word = self.index.word(bigram, self.random.randrange(count))
+                    if self.allowed is None or self.allowed(word):
+                        return word
+        return self.fallback()
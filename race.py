@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import collections
+import heapq
+import json
+import queue
+import random
+import threading
+import time
+import typing
+
+import corpus
+from levels import DEFAULT_LEVEL, WordSampler
+from session import TypingSession
+
+
+"""
+Race mode
+
+RaceServer runs rounds in which every connected player types the same word
+list. Clients send batched key frames, the server replays them through a
+TypingSession per player (the same rules the single-player game uses) and
+broadcasts the standings at a fixed tick. The protocol is newline-delimited
+JSON over TCP (`host:port`) or a Unix socket (`unix:/path`):
+
+    client -> server  {"type": "join", "name": str}
+                      {"type": "keys", "keys": [[keysym, seconds since round start], ...]}
+    server -> client  {"type": "round", "round": int, "words": [str], "time_limit": float,
+                       "elapsed": float, "level": str}
+                      {"type": "standings", "round": int, "t": server monotonic time,
+                       "elapsed": float, "players": int, "final": bool,
+                       "top": [[name, wpm, accuracy, correct words], ...]}
+
+RaceClient is the game's side of the connection, and `python race.py loadgen`
+simulates thousands of typists against a server to measure broadcast latency.
+
+Usage:
+    python race.py serve --listen unix:/tmp/taptype.sock
+    python main.py --race unix:/tmp/taptype.sock
+    python race.py loadgen --connect unix:/tmp/taptype.sock --clients 10000
+"""
+
+TICK_INTERVAL = 0.25
+FRAME_INTERVAL = 0.1
+TOP_PLAYERS = 10
+# How far ahead of the server's clock a client's key timestamps may run
+CLOCK_TOLERANCE = 1.0
+# Clients with more than this much unsent data skip standings until they catch up
+MAX_WRITE_BUFFER = 256 * 1024
+STREAM_LIMIT = 1 << 20
+
+
+async def open_connection(address: str) -> typing.Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[5:], limit=STREAM_LIMIT)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port), limit=STREAM_LIMIT)
+
+
+def encode(message: typing.Dict[str, typing.Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class Player:
+    __slots__ = ("name", "writer", "session", "last_time")
+
+    def __init__(self, name: str, writer: asyncio.StreamWriter) -> None:
+        self.name = name
+        self.writer = writer
+        self.session: typing.Optional[TypingSession] = None
+        self.last_time: float = 0
+
+
+class RaceServer:
+    """Hands out rounds, validates key frames and broadcasts standings."""
+
+    def __init__(self, draw_words: typing.Callable[[], typing.List[str]], time_limit: float = 60,
+                 intermission: float = 5, level: str = "") -> None:
+        self.draw_words = draw_words
+        self.time_limit = time_limit
+        self.intermission = intermission
+        self.level = level
+        self.players: typing.Set[Player] = set()
+        self.round: int = 0
+        self.words: typing.List[str] = []
+        self.round_start: float = 0
+        self.running: bool = False
+        self.keys_received: int = 0
+        self.broadcasts: int = 0
+        self.skipped_broadcasts: int = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.round_start
+
+    def round_message(self) -> bytes:
+        return encode({"type": "round", "round": self.round, "words": self.words, "time_limit": self.time_limit,
+                       "elapsed": self.elapsed(), "level": self.level})
+
+    def join_round(self, player: Player) -> None:
+        player.session = TypingSession(self.words, self.time_limit)
+        player.session.start(0)
+        player.last_time = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        player: typing.Optional[Player] = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    break
+                if player is None:
+                    if message.get("type") != "join":
+                        break
+                    player = Player(str(message.get("name", "player"))[:32], writer)
+                    self.players.add(player)
+                    if self.running:
+                        self.join_round(player)
+                        writer.write(self.round_message())
+                elif message.get("type") == "keys" and self.running and player.session is not None:
+                    self.feed(player, message.get("keys", ()))
+        except (ValueError, TypeError, ConnectionError, asyncio.LimitOverrunError):
+            # A malformed frame (bad JSON, or keys that aren't [keysym, time] pairs) drops the client
+            pass
+        finally:
+            if player is not None:
+                self.players.discard(player)
+            writer.close()
+
+    def feed(self, player: Player, keys: typing.Iterable[typing.Sequence[typing.Any]]) -> None:
+        """Replay a frame of keys through the player's session, clamping timestamps to the server clock."""
+        latest = self.elapsed() + CLOCK_TOLERANCE
+        typing_session = player.session
+        last_time = player.last_time
+        for keysym, timestamp in keys:
+            timestamp = min(max(float(timestamp), last_time), latest)
+            if timestamp > self.time_limit:
+                break
+            last_time = timestamp
+            typing_session.on_key(str(keysym), timestamp)
+            self.keys_received += 1
+        player.last_time = last_time
+
+    def standings(self, final: bool = False) -> bytes:
+        elapsed = min(self.elapsed(), self.time_limit)
+        # Everyone shares the round clock, so ranking by typed characters is ranking by WPM
+        leaders = heapq.nlargest(TOP_PLAYERS, (player for player in self.players if player.session is not None),
+                                 key=lambda player: player.session.typed_characters)
+        top = []
+        for player in leaders:
+            score = player.session.snapshot(elapsed)
+            top.append([player.name, round(score.wpm, 1), round(score.accuracy, 1), score.correct_words])
+        return encode({"type": "standings", "round": self.round, "t": time.monotonic(), "elapsed": elapsed,
+                       "players": len(self.players), "final": final, "top": top})
+
+    def broadcast(self, data: bytes) -> None:
+        for player in self.players:
+            transport = player.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.skipped_broadcasts += 1
+                continue
+            player.writer.write(data)
+        self.broadcasts += 1
+
+    async def run_rounds(self) -> None:
+        while True:
+            self.round += 1
+            self.words = self.draw_words()
+            self.round_start = time.monotonic()
+            self.running = True
+            for player in self.players:
+                self.join_round(player)
+            self.broadcast(self.round_message())
+            next_tick = self.round_start
+            while self.elapsed() < self.time_limit:
+                next_tick += TICK_INTERVAL
+                await asyncio.sleep(max(0, next_tick - time.monotonic()))
+                self.broadcast(self.standings())
+            self.running = False
+            self.broadcast(self.standings(final=True))
+            await asyncio.sleep(self.intermission)
+
+
+async def serve(server: RaceServer, address: str) -> None:
+    if address.startswith("unix:"):
+        listener = await asyncio.start_unix_server(server.handle, address[5:], limit=STREAM_LIMIT)
+    else:
+        host, _, port = address.rpartition(":")
+        listener = await asyncio.start_server(server.handle, host or "127.0.0.1", int(port), limit=STREAM_LIMIT)
+    async with listener:
+        await server.run_rounds()
+
+
+class RaceClient:
+    """Game-side connection, run on a background thread with its own event loop.
+
+    The Tk thread calls `send_key` and drains `inbox`; keys are batched into a
+    frame every FRAME_INTERVAL.
+    """
+
+    def __init__(self, address: str, name: str) -> None:
+        self.address = address
+        self.name = name
+        self.inbox: "queue.SimpleQueue[typing.Dict[str, typing.Any]]" = queue.SimpleQueue()
+        self.connected: bool = False
+        self._keys: typing.Deque[typing.Tuple[str, float]] = collections.deque()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._main, name="race-client", daemon=True)
+        self._thread.start()
+
+    def send_key(self, keysym: str, timestamp: float) -> None:
+        self._keys.append((keysym, round(timestamp, 4)))
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._cancel_tasks)
+            self._thread.join(timeout=1)
+
+    def _cancel_tasks(self) -> None:
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+
+    def _main(self) -> None:
+        try:
+            self._loop.run_until_complete(self._run())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def _run(self) -> None:
+        try:
+            reader, writer = await open_connection(self.address)
+        except OSError as error:
+            self.inbox.put({"type": "error", "message": str(error)})
+            return
+        self.connected = True
+        writer.write(encode({"type": "join", "name": self.name}))
+        flusher = asyncio.ensure_future(self._flush(writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.inbox.put(json.loads(line))
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            self.connected = False
+            flusher.cancel()
+            writer.close()
+            self.inbox.put({"type": "error", "message": "disconnected from race server"})
+
+    async def _flush(self, writer: asyncio.StreamWriter) -> None:
+        keys = self._keys
+        while True:
+            await asyncio.sleep(FRAME_INTERVAL)
+            if keys:
+                frame = [keys.popleft() for _ in range(len(keys))]
+                writer.write(encode({"type": "keys", "keys": frame}))
+
+
+class SimulatedTypist:
+    __slots__ = ("keysyms", "position", "chars_per_second", "round_start", "error_rate")
+
+    def __init__(self, wpm: float, error_rate: float) -> None:
+        self.keysyms: typing.List[str] = []
+        self.position: int = 0
+        self.chars_per_second = wpm * 5 / 60
+        self.round_start: float = 0
+        self.error_rate = error_rate
+
+    def start_round(self, words: typing.List[str], elapsed: float, rng: random.Random) -> None:
+        keysyms = []
+        for word in words:
+            for char in word:
+                if rng.random() < self.error_rate:
+                    keysyms.append("x")
+                    keysyms.append("BackSpace")
+                keysyms.append(char)
+            keysyms.append("Return")
+        self.keysyms = keysyms
+        self.position = 0
+        self.round_start = time.monotonic() - elapsed
+
+    def due_keys(self) -> typing.List[typing.Tuple[str, float]]:
+        elapsed = time.monotonic() - self.round_start
+        due = min(int(elapsed * self.chars_per_second), len(self.keysyms))
+        keys = [(self.keysyms[i], round((i + 1) / self.chars_per_second, 4)) for i in range(self.position, due)]
+        self.position = due
+        return keys
+
+
+async def load_generator(address: str, clients: int, duration: float, wpm: float, error_rate: float) -> None:
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = clients + 256 if hard == resource.RLIM_INFINITY else min(hard, clients + 256)
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    rng = random.Random(0)
+    latencies: typing.List[float] = []
+    typists: typing.List[typing.Tuple[SimulatedTypist, asyncio.StreamWriter]] = []
+    counters = {"keys": 0, "frames": 0, "standings": 0}
+
+    async def read(reader: asyncio.StreamReader, typist: SimulatedTypist) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if message["type"] == "standings":
+                latencies.append(time.monotonic() - message["t"])
+                counters["standings"] += 1
+            elif message["type"] == "round":
+                typist.start_round(message["words"], message["elapsed"], rng)
+
+    readers = []
+    for n in range(clients):
+        reader, writer = await open_connection(address)
+        typist = SimulatedTypist(rng.uniform(0.5, 1.5) * wpm, error_rate)
+        writer.write(encode({"type": "join", "name": f"bot{n}"}))
+        typists.append((typist, writer))
+        readers.append(asyncio.ensure_future(read(reader, typist)))
+    print(f"connected {clients} typists")
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(FRAME_INTERVAL)
+        for typist, writer in typists:
+            keys = typist.due_keys()
+            if keys:
+                writer.write(encode({"type": "keys", "keys": keys}))
+                counters["keys"] += len(keys)
+                counters["frames"] += 1
+
+    for task in readers:
+        task.cancel()
+    for _, writer in typists:
+        writer.close()
+
+    print(f"keys sent: {counters['keys']} in {counters['frames']} frames")
+    print(f"standings received: {counters['standings']}")
+    if latencies:
+        latencies.sort()
+        for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            print(f"broadcast latency {label}: {latencies[int(len(latencies) * fraction)] * 1000:.1f} ms")
+        print(f"broadcast latency max: {latencies[-1] * 1000:.1f} ms")
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="TapType race server and load generator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run a race server")
+    serve_parser.add_argument("--listen", default="127.0.0.1:8765", help="host:port or unix:/path")
+    serve_parser.add_argument("--words", default="words.txt", help="word list to draw rounds from")
+    serve_parser.add_argument("--level", default=None, help="difficulty level of the drawn words")
+    serve_parser.add_argument("--count", type=int, default=300, help="words per round")
+    serve_parser.add_argument("--time-limit", type=float, default=60, help="round length in seconds")
+    serve_parser.add_argument("--intermission", type=float, default=5, help="seconds between rounds")
+    load_parser = commands.add_parser("loadgen", help="simulate many typists against a server")
+    load_parser.add_argument("--connect", default="127.0.0.1:8765", help="host:port or unix:/path")
+    load_parser.add_argument("--clients", type=int, default=1000)
+    load_parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    load_parser.add_argument("--wpm", type=float, default=80, help="average simulated typing speed")
+    load_parser.add_argument("--error-rate", type=float, default=0.03)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        words = corpus.open_corpus(args.words)
+        sampler = WordSampler(words, level=args.level or DEFAULT_LEVEL)
+        server = RaceServer(lambda: [words[sampler()] for _ in range(args.count)], args.time_limit,
+                            args.intermission, sampler.level)
+        try:
+            asyncio.run(serve(server, args.listen))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(load_generator(args.connect, args.clients, args.duration, args.wpm, args.error_rate))
+
+
+if __name__ == "__main__":
+    main()
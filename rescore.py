@@ -0,0 +1,194 @@
+import argparse
+import concurrent.futures
+import csv
+import heapq
+import itertools
+import json
+import os
+import sys
+import typing
+
+import keylog
+import session
+
+
+"""
+Batch re-scoring of archived key logs
+
+Walks a directory of .tapk logs and re-scores every round with the game's own
+WPM and accuracy rules (session.calculate_wpm / calculate_accuracy). Paths are
+handed to a process pool in chunks with a bounded number of chunks in flight,
+and results are written out as they arrive, so memory stays flat however big
+the archive is. Leaderboards are aggregated on the way and written at the end.
+
+Usage:
+    python rescore.py logs/ --format csv --output scores.csv --leaderboard top.json
+"""
+
+FIELDS = ("path", "user", "mode", "level", "wpm", "accuracy",
+          "typed_characters", "correct_characters", "elapsed_time")
+
+CORRECT_BYTE = bytes([session.CORRECT])
+INCORRECT_BYTE = bytes([session.INCORRECT])
+
+
+def score_log(path: str, chunk_records: int = 65536) -> typing.Dict[str, typing.Any]:
+    """Re-score one key log, streaming it in chunks; time spent paused is left out."""
+    typed_characters = 0
+    correct_characters = 0
+    elapsed_ns = 0
+    after_pause = False
+    chunk_size = chunk_records * keylog.RECORD.size
+    native = sys.byteorder == "little"
+    with open(path, "rb") as f:
+        _, metadata = keylog.read_header(f)
+        while True:
+            chunk = f.read(chunk_size)
+            chunk = chunk[:len(chunk) - len(chunk) % keylog.RECORD.size]
+            results = chunk[keylog.RESULT_OFFSET::keylog.RECORD.size]
+            paused = keylog.paused_records(results, after_pause)
+            after_pause = results.endswith(keylog.PAUSE_BYTE)
+            if native:
+                # Counting and summing whole columns keeps the per-record work in C
+                correct = results.count(CORRECT_BYTE)
+                typed_characters += correct + results.count(INCORRECT_BYTE)
+                correct_characters += correct
+                deltas = memoryview(chunk).cast("Q")[::2]
+                elapsed_ns += sum(deltas) - sum(deltas[index] for index in paused)
+            else:
+                paused = set(paused)
+                for index, (delta_ns, _, result) in enumerate(keylog.RECORD.iter_unpack(chunk)):
+                    if index not in paused:
+                        elapsed_ns += delta_ns
+                    if result == session.CORRECT or result == session.INCORRECT:
+                        typed_characters += 1
+                        correct_characters += result == session.CORRECT
+            if len(chunk) < chunk_size:
+                break
+    elapsed_time = elapsed_ns / 1e9
+    return {
+        "path": path,
+        "user": metadata.get("user"),
+        "mode": metadata.get("mode"),
+        "level": metadata.get("level"),
+        "wpm": session.calculate_wpm(typed_characters, elapsed_time),
+        "accuracy": session.calculate_accuracy(correct_characters, typed_characters),
+        "typed_characters": typed_characters,
+        "correct_characters": correct_characters,
+        "elapsed_time": elapsed_time,
+    }
+
+
+def score_chunk(paths: typing.List[str]) -> typing.List[typing.Dict[str, typing.Any]]:
+    results = []
+    for path in paths:
+        try:
+            results.append(score_log(path))
+        except (OSError, ValueError) as error:
+            print(f"{path}: {error}", file=sys.stderr)
+    return results
+
+
+def chunked(iterable: typing.Iterable[str], size: int) -> typing.Iterator[typing.List[str]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_all(paths: typing.Iterable[str], workers: int, chunk_size: int) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """Score logs on a process pool, yielding results in completion order."""
+    chunks = chunked(paths, chunk_size)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(score_chunk, chunk) for chunk in itertools.islice(chunks, workers * 4)}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(pool.submit(score_chunk, chunk))
+
+
+class Leaderboard:
+    """Running top-N by WPM overall, per level and per user's best round."""
+
+    def __init__(self, size: int = 10) -> None:
+        self.size = size
+        self.rounds: int = 0
+        self.overall: typing.List[typing.Tuple[float, str, typing.Dict[str, typing.Any]]] = []
+        self.levels: typing.Dict[str, typing.List[typing.Tuple[float, str, typing.Dict[str, typing.Any]]]] = {}
+        self.users: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+
+    def _push(self, heap: list, result: typing.Dict[str, typing.Any]) -> None:
+        entry = (result["wpm"], result["path"], result)
+        if len(heap) < self.size:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def add(self, result: typing.Dict[str, typing.Any]) -> None:
+        self.rounds += 1
+        self._push(self.overall, result)
+        self._push(self.levels.setdefault(f"{result['mode']}/{result['level']}", []), result)
+        user = self.users.get(result["user"])
+        if user is None:
+            self.users[result["user"]] = {"rounds": 1, "best": result}
+        else:
+            user["rounds"] += 1
+            if result["wpm"] > user["best"]["wpm"]:
+                user["best"] = result
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        def ranked(heap: list) -> typing.List[typing.Dict[str, typing.Any]]:
+            return [entry[2] for entry in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+        best_users = sorted(self.users.items(), key=lambda item: item[1]["best"]["wpm"], reverse=True)
+        return {
+            "rounds": self.rounds,
+            "overall": ranked(self.overall),
+            "levels": {level: ranked(heap) for level, heap in sorted(self.levels.items())},
+            "users": [{"user": user, "rounds": stats["rounds"], "best": stats["best"]}
+                      for user, stats in best_users[:self.size]],
+        }
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-score archived key logs with the game's WPM and accuracy rules.")
+    parser.add_argument("paths", nargs="+", help="key log files or directories of them")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="jsonl", help="per-round output format")
+    parser.add_argument("--output", help="per-round output file (default: stdout)")
+    parser.add_argument("--leaderboard", help="write the aggregate leaderboards as JSON to this file (default: stderr)")
+    parser.add_argument("--top", type=int, default=10, help="entries per leaderboard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=256, help="logs per unit of work")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    leaderboard = Leaderboard(args.top)
+    try:
+        writer = csv.DictWriter(out, FIELDS) if args.format == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        for result in score_all(keylog.iter_log_paths(args.paths), args.workers, args.chunk_size):
+            leaderboard.add(result)
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                out.write(json.dumps(result) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    report = json.dumps(leaderboard.report(), indent=2)
+    if args.leaderboard:
+        with open(args.leaderboard, "w") as f:
+            f.write(report)
+    else:
+        print(report, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
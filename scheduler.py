@@ -0,0 +1,85 @@
+import time
+import tkinter as tk
+import typing
+
+
+class RefreshScheduler:
+    """Owns the single Tk `after` chain that refreshes the game UI.
+
+    The scheduler ticks every `idle_interval_ms` while running so the timer
+    keeps moving, and `mark_dirty` pulls the next tick forward so a key press
+    is drawn within one frame budget. There is never more than one pending
+    callback, no matter how often `mark_dirty` is called; `pending_callbacks`
+    (and its high-water mark) is exported so that can be checked.
+    """
+
+    def __init__(self, widget: tk.Misc, callback: typing.Callable[[], None],
+                 frame_budget_ms: int = 16, idle_interval_ms: int = 100) -> None:
+        self.widget = widget
+        self.callback = callback
+        self.frame_budget = frame_budget_ms / 1000
+        self.idle_interval = idle_interval_ms / 1000
+        self.running: bool = False
+        self.ticks: int = 0
+        self.scheduled_callbacks: int = 0
+        self.pending_callbacks: int = 0
+        self.max_pending_callbacks: int = 0
+        # Seconds the last tick (and the latest tick so far) ran after it was due
+        self.lag: float = 0
+        self.max_lag: float = 0
+        self._after_id: typing.Optional[str] = None
+        self._due: float = 0
+        self._last_tick: float = 0
+
+    def start(self) -> None:
+        self.running = True
+        self._schedule(0)
+
+    def stop(self) -> None:
+        self.running = False
+        self._cancel()
+
+    def mark_dirty(self) -> None:
+        """Something changed on screen; refresh within one frame budget."""
+        if not self.running:
+            return
+        now = time.perf_counter()
+        due = max(now, self._last_tick + self.frame_budget)
+        if self._after_id is None or due < self._due:
+            self._schedule(due - now)
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "ticks": self.ticks,
+            "scheduled_callbacks": self.scheduled_callbacks,
+            "pending_callbacks": self.pending_callbacks,
+            "max_pending_callbacks": self.max_pending_callbacks,
+            "max_lag": self.max_lag,
+        }
+
+    def _schedule(self, delay: float) -> None:
+        self._cancel()
+        self._due = time.perf_counter() + delay
+        self._after_id = self.widget.after(int(delay * 1000), self._tick)
+        self.scheduled_callbacks += 1
+        self.pending_callbacks += 1
+        if self.pending_callbacks > self.max_pending_callbacks:
+            self.max_pending_callbacks = self.pending_callbacks
+
+    def _cancel(self) -> None:
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+            self.pending_callbacks -= 1
+
+    def _tick(self) -> None:
+        self._after_id = None
+        self.pending_callbacks -= 1
+        self._last_tick = time.perf_counter()
+        self.lag = max(0.0, self._last_tick - self._due)
+        if self.lag > self.max_lag:
+            self.max_lag = self.lag
+        self.ticks += 1
+        self.callback()
+        if self.running and self._after_id is None:
+            self._schedule(self.idle_interval)
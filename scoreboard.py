@@ -0,0 +1,181 @@
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import typing
+
+
+"""
+Scoreboard
+
+Finished rounds are stored in SQLite (WAL mode) with indexes for top-N
+queries by mode/level and by user. Writes never touch the disk on the
+caller's thread: `submit` only queues the row, and a background writer thread
+inserts queued rows in batches. Leaderboard reads are cached and the cache is
+invalidated whenever the writer commits. The best round (and best logged
+round) per mode, level and user is loaded once on open and then kept up to
+date by `submit`, so `best` and `best_log` never query SQLite.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    level TEXT NOT NULL,
+    wpm REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    typed_characters INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    log_path TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_level ON sessions (mode, level, wpm DESC);
+CREATE INDEX IF NOT EXISTS sessions_by_user ON sessions (user, mode, level, wpm DESC);
+"""
+
+INSERT = """
+INSERT INTO sessions (user, mode, level, wpm, accuracy, typed_characters, duration, ended_at, log_path)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Each user's fastest round per mode and level; SQLite fills the bare columns from the MAX(wpm) row
+BEST = """
+SELECT user, wpm, accuracy, typed_characters, duration, ended_at, log_path, mode, level, MAX(wpm)
+FROM sessions {where} GROUP BY user, mode, level
+"""
+
+# Columns added after the first release, with their definitions, for databases created before them
+MIGRATIONS = (
+    ("log_path", "TEXT"),
+)
+
+
+class ScoreRow(typing.NamedTuple):
+    user: str
+    wpm: float
+    accuracy: float
+    typed_characters: int
+    duration: float
+    ended_at: float
+    log_path: typing.Optional[str] = None
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(sessions)")}
+    with connection:
+        for column, definition in MIGRATIONS:
+            if column not in columns:
+                connection.execute(f"ALTER TABLE sessions ADD COLUMN {column} {definition}")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class Scoreboard:
+    """SQLite score store with a batching background writer and a cached leaderboard."""
+
+    def __init__(self, path: str = "scores.db", batch_size: int = 500) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.reader = connect(path)
+        self.reader.executescript(SCHEMA)
+        migrate(self.reader)
+        self.generation: int = 0
+        self.written: int = 0
+        self._cache: typing.Dict[tuple, typing.Tuple[int, typing.List[ScoreRow]]] = {}
+        # (mode, level, user or None for everyone) -> fastest round, and (mode, level, user) -> fastest logged round
+        self._best: typing.Dict[typing.Tuple[str, str, typing.Optional[str]], ScoreRow] = {}
+        self._best_logged: typing.Dict[typing.Tuple[str, str, str], ScoreRow] = {}
+        for row in self.reader.execute(BEST.format(where="")):
+            self._remember(row[7], row[8], ScoreRow(*row[:7]))
+        for row in self.reader.execute(BEST.format(where="WHERE log_path IS NOT NULL")):
+            self._remember(row[7], row[8], ScoreRow(*row[:7]))
+        self._queue: "queue.Queue[typing.Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="scoreboard-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, user: str, mode: str, level: str, wpm: float, accuracy: float,
+               typed_characters: int, duration: float, ended_at: typing.Optional[float] = None,
+               log_path: typing.Optional[str] = None) -> None:
+        """Queue a finished round, with the key log it was recorded to if any; returns immediately."""
+        ended_at = time.time() if ended_at is None else ended_at
+        self._queue.put((user, mode, level, wpm, accuracy, typed_characters, duration, ended_at, log_path))
+        self._remember(mode, level, ScoreRow(user, wpm, accuracy, typed_characters, duration, ended_at, log_path))
+
+    def _remember(self, mode: str, level: str, row: ScoreRow) -> None:
+        for key in ((mode, level, row.user), (mode, level, None)):
+            best = self._best.get(key)
+            if best is None or row.wpm > best.wpm:
+                self._best[key] = row
+        if row.log_path is not None:
+            key = (mode, level, row.user)
+            best = self._best_logged.get(key)
+            if best is None or row.wpm > best.wpm:
+                self._best_logged[key] = row
+
+    def top(self, mode: str, level: str, user: typing.Optional[str] = None, limit: int = 10) -> typing.List[ScoreRow]:
+        """Best rounds for a mode and level, optionally for one user, fastest first."""
+        key = (mode, level, user, limit)
+        generation = self.generation
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        query = "SELECT user, wpm, accuracy, typed_characters, duration, ended_at, log_path FROM sessions WHERE "
+        if user is None:
+            query += "mode = ? AND level = ? ORDER BY wpm DESC LIMIT ?"
+            params: tuple = (mode, level, limit)
+        else:
+            query += "user = ? AND mode = ? AND level = ? ORDER BY wpm DESC LIMIT ?"
+            params = (user, mode, level, limit)
+        rows = [ScoreRow(*row) for row in self.reader.execute(query, params)]
+        self._cache[key] = (generation, rows)
+        return rows
+
+    def best(self, mode: str, level: str, user: typing.Optional[str] = None) -> typing.Optional[ScoreRow]:
+        """Fastest round for a mode and level, optionally for one user, from memory."""
+        return self._best.get((mode, level, user))
+
+    def best_log(self, mode: str, level: str, user: str) -> typing.Optional[str]:
+        """Key log of the user's fastest recorded round, for racing against it, from memory."""
+        row = self._best_logged.get((mode, level, user))
+        return row.log_path if row is not None else None
+
+    def flush(self) -> None:
+        """Block until everything submitted so far is written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join()
+        self.reader.close()
+
+    def _write_loop(self) -> None:
+        connection = connect(self.path)
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            closing = len(rows) < len(batch)
+            if rows:
+                try:
+                    with connection:
+                        connection.executemany(INSERT, rows)
+                except sqlite3.Error as error:
+                    print(f"Unable to save {len(rows)} scores: {error}", file=sys.stderr)
+                else:
+                    self.written += len(rows)
+                    self.generation += 1
+            for _ in batch:
+                self._queue.task_done()
+        connection.close()
@@ -0,0 +1,364 @@
+import typing
+
+if typing.TYPE_CHECKING:
+    from practice import KeyStats
+
+
+"""
+TypingSession
+
+Headless scoring engine behind FastTypeGame. It takes (keysym, timestamp) key
+events, plus the character Tk says the key typed where there is one, and keeps
+the score state, without touching any Tk widgets, so the
+game logic can be driven and measured without a display.
+"""
+
+# Results returned by TypingSession.on_key
+IGNORED = 0
+CORRECT = 1
+INCORRECT = 2
+BACKSPACE = 3
+WORD_CORRECT = 4
+WORD_INCORRECT = 5
+END = 6
+# Key log markers written around a pause; never returned by on_key
+PAUSE = 7
+RESUME = 8
+
+# Tk keysyms that insert a character but are not the character itself
+KEYSYM_CHARS: typing.Dict[str, str] = {
+    "space": " ",
+    "exclam": "!",
+    "quotedbl": '"',
+    "numbersign": "#",
+    "dollar": "$",
+    "percent": "%",
+    "ampersand": "&",
+    "apostrophe": "'",
+    "parenleft": "(",
+    "parenright": ")",
+    "asterisk": "*",
+    "plus": "+",
+    "comma": ",",
+    "minus": "-",
+    "period": ".",
+    "slash": "/",
+    "colon": ":",
+    "semicolon": ";",
+    "less": "<",
+    "equal": "=",
+    "greater": ">",
+    "question": "?",
+    "at": "@",
+    "bracketleft": "[",
+    "backslash": "\\",
+    "bracketright": "]",
+    "asciicircum": "^",
+    "underscore": "_",
+    "grave": "`",
+    "braceleft": "{",
+    "bar": "|",
+    "braceright": "}",
+    "asciitilde": "~",
+}
+# The keysym that types each of those characters (and a passage's newlines and tabs), for generating key events
+CHAR_KEYSYMS: typing.Dict[str, str] = {char: keysym for keysym, char in KEYSYM_CHARS.items()}
+CHAR_KEYSYMS.update({"\n": "Return", "\t": "Tab"})
+
+
+def keysym_to_char(keysym: str) -> typing.Optional[str]:
+    """Return the character a keysym types, or None for non-printing keys."""
+    if len(keysym) == 1:
+        return keysym
+    return KEYSYM_CHARS.get(keysym)
+
+
+def char_keysym(char: str) -> str:
+    """Return the keysym that types `char`; letters and digits are their own keysym."""
+    return CHAR_KEYSYMS.get(char, char)
+
+
+def key_char(keysym: str, char: str = "") -> typing.Optional[str]:
+    """Return the character a key event types, preferring Tk's event.char over the keysym.
+
+    Keysyms only name ASCII characters directly; event.char also covers
+    accented, non-Latin and keypad keys (adiaeresis, Cyrillic_a, KP_1).
+    """
+    if len(char) == 1 and char.isprintable():
+        return char
+    return keysym_to_char(keysym)
+
+
+def calculate_wpm(typed_characters: int, elapsed_time: float) -> float:
+    """Words per minute, counting five typed characters as one word."""
+    if elapsed_time > 0:
+        return (typed_characters / 5) / elapsed_time * 60
+    return 0
+
+
+def calculate_accuracy(correct_characters: int, typed_characters: int) -> float:
+    """Percentage of typed characters that were correct."""
+    if typed_characters > 0:
+        return (correct_characters / typed_characters) * 100
+    return 0
+
+
+class Score(typing.NamedTuple):
+    elapsed_time: float
+    wpm: float
+    accuracy: float
+    typed_words: int
+    correct_words: int
+    incorrect_words: int
+    typed_characters: int
+    correct_characters: int
+    incorrect_characters: int
+
+
+class TypingSession:
+    """Score state of one round, fed one key event at a time."""
+
+    __slots__ = (
+        "words", "picker", "word_index", "time_limit", "start_time", "finished",
+        "typed_words", "correct_words", "incorrect_words",
+        "typed_characters", "correct_characters", "incorrect_characters",
+        "word", "cursor", "first_error", "paused_at", "stats", "last_key_time",
+    )
+
+    def __init__(self, words: typing.Sequence[str], time_limit: float = 20,
+                 picker: typing.Optional[typing.Callable[[], int]] = None,
+                 stats: typing.Optional["KeyStats"] = None) -> None:
+        # Without a picker the words are walked in order and the round ends after the last one
+        self.words = words
+        self.picker = picker
+        self.stats = stats
+        self.time_limit = time_limit
+        self.start(0)
+
+    def start(self, timestamp: float) -> None:
+        self.start_time = timestamp
+        self.finished = False
+        self.word_index = 0 if self.picker is None else self.picker()
+        self.typed_words = 0
+        self.correct_words = 0
+        self.incorrect_words = 0
+        self.typed_characters = 0
+        self.correct_characters = 0
+        self.incorrect_characters = 0
+        self.paused_at = None
+        self.last_key_time = timestamp
+        self.new_word()
+
+    @property
+    def current_word(self) -> str:
+        return self.word
+
+    def new_word(self) -> None:
+        self.word = self.words[self.word_index]
+        self.cursor = 0
+        self.first_error = -1
+
+    def on_key(self, keysym: str, timestamp: float, char: str = "") -> int:
+        if self.finished:
+            return IGNORED
+        if keysym == "Return":
+            return self.check_word()
+        if keysym == "Escape":
+            self.finished = True
+            return END
+        if keysym == "BackSpace":
+            if self.cursor > 0:
+                self.cursor -= 1
+                if self.cursor <= self.first_error:
+                    self.first_error = -1
+            return BACKSPACE
+        char = key_char(keysym, char)
+        if char is None:
+            return IGNORED
+        self.typed_characters += 1
+        result = self.check_character(char, timestamp - self.last_key_time)
+        self.last_key_time = timestamp
+        return result
+
+    def check_character(self, char: str, latency: float = 0) -> int:
+        """Judge `char` at the cursor; everything after the first error is wrong."""
+        cursor = self.cursor
+        word = self.word
+        self.cursor = cursor + 1
+        if self.first_error < 0 and cursor < len(word):
+            correct = word[cursor] == char
+            if self.stats is not None:
+                self.stats.record(word[cursor - 1] if cursor else "", word[cursor], correct, latency)
+            if correct:
+                self.correct_characters += 1
+                return CORRECT
+        if self.first_error < 0:
+            self.first_error = cursor
+        self.incorrect_characters += 1
+        return INCORRECT
+
+    def check_word(self) -> int:
+        self.typed_words += 1
+        correct = self.first_error < 0 and self.cursor == len(self.word)
+        if correct:
+            self.correct_words += 1
+        else:
+            self.incorrect_words += 1
+        if self.picker is not None:
+            self.word_index = self.picker()
+        else:
+            self.word_index += 1
+            if self.word_index >= len(self.words):
+                self.finished = True
+                return END
+        self.new_word()
+        return WORD_CORRECT if correct else WORD_INCORRECT
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_at is not None
+
+    def pause(self, timestamp: float) -> None:
+        self.paused_at = timestamp
+
+    def resume(self, timestamp: float) -> None:
+        if self.paused_at is not None:
+            self.start_time += timestamp - self.paused_at
+            self.paused_at = None
+
+    def expired(self, timestamp: float) -> bool:
+        return timestamp - self.start_time > self.time_limit
+
+    def calculate_wpm(self, timestamp: float) -> float:
+        return calculate_wpm(self.typed_characters, timestamp - self.start_time)
+
+    def calculate_accuracy(self) -> float:
+        return calculate_accuracy(self.correct_characters, self.typed_characters)
+
+    def snapshot(self, timestamp: float) -> Score:
+        return Score(
+            timestamp - self.start_time,
+            self.calculate_wpm(timestamp),
+            self.calculate_accuracy(),
+            self.typed_words,
+            self.correct_words,
+            self.incorrect_words,
+            self.typed_characters,
+            self.correct_characters,
+            self.incorrect_characters,
+        )
+
+
+# Keys that type whitespace in a passage but submit or move focus elsewhere
+PASSAGE_KEYSYMS: typing.Dict[str, str] = {"Return": "\n", "KP_Enter": "\n", "Tab": "\t"}
+
+
+class PassageSession(TypingSession):
+    """Score state of typing one continuous passage instead of single words.
+
+    The cursor walks the whole text; a wrong key is marked and still advances
+    it, and BackSpace steps back over it. `status` holds the result (CORRECT,
+    INCORRECT, or IGNORED for not typed yet) of every character, so a view can
+    redraw any range of the passage without replaying keys. A word counts when
+    the whitespace after it (or the end of the passage) is typed, and is
+    judged from the status of its characters and that separator; backspacing
+    over the separator takes the word back out of the counts.
+    """
+
+    __slots__ = ("status",)
+
+    def __init__(self, passage: str, time_limit: float = 20,
+                 stats: typing.Optional["KeyStats"] = None) -> None:
+        self.status = bytearray(len(passage))
+        super().__init__([passage], time_limit, stats=stats)
+
+    def start(self, timestamp: float) -> None:
+        super().start(timestamp)
+        self.status[:] = bytes(len(self.status))
+
+    @property
+    def passage(self) -> str:
+        return self.word
+
+    @property
+    def current_word(self) -> str:
+        """The word under the cursor, up to the next whitespace."""
+        text = self.word
+        end = self.cursor
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        start = self.cursor
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        return text[start:end]
+
+    def on_key(self, keysym: str, timestamp: float, char: str = "") -> int:
+        if self.finished:
+            return IGNORED
+        if keysym == "Escape":
+            self.finished = True
+            return END
+        if keysym == "BackSpace":
+            if self.cursor > 0:
+                self.cursor -= 1
+                if self.ends_word(self.cursor):
+                    self.count_word(self.cursor, -1)
+                self.status[self.cursor] = IGNORED
+                if self.cursor <= self.first_error:
+                    self.first_error = -1
+            return BACKSPACE
+        char = PASSAGE_KEYSYMS.get(keysym) or key_char(keysym, char)
+        if char is None:
+            return IGNORED
+        self.typed_characters += 1
+        result = self.check_character(char, timestamp - self.last_key_time)
+        self.last_key_time = timestamp
+        return result
+
+    def check_character(self, char: str, latency: float = 0) -> int:
+        cursor = self.cursor
+        text = self.word
+        expected = text[cursor]
+        correct = expected == char
+        if self.stats is not None:
+            self.stats.record(text[cursor - 1] if cursor else "", expected, correct, latency)
+        result = CORRECT if correct else INCORRECT
+        self.status[cursor] = result
+        self.cursor = cursor + 1
+        if correct:
+            self.correct_characters += 1
+        else:
+            self.incorrect_characters += 1
+            if self.first_error < 0:
+                self.first_error = cursor
+        if self.ends_word(cursor):
+            self.count_word(cursor, 1)
+            self.first_error = -1
+            if self.cursor == len(text):
+                # The last key keeps its own result so it is logged; finished ends the round
+                self.finished = True
+        return result
+
+    def ends_word(self, position: int) -> bool:
+        """Whether typing the character at `position` completes a word."""
+        text = self.word
+        if text[position].isspace():
+            # Runs of whitespace don't make empty words
+            return position > 0 and not text[position - 1].isspace()
+        return position == len(text) - 1
+
+    def word_correct(self, position: int) -> bool:
+        """Judge the word completed at `position` from the status of its characters."""
+        text = self.word
+        start = position
+        while start > 0 and not text[start - 1].isspace():
+            start -= 1
+        return INCORRECT not in self.status[start:position + 1]
+
+    def count_word(self, position: int, change: int) -> None:
+        """Add (1) or take back (-1) the word completed at `position`."""
+        self.typed_words += change
+        if self.word_correct(position):
+            self.correct_words += change
+        else:
+            self.incorrect_words += change
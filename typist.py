@@ -0,0 +1,249 @@
+import argparse
+import collections
+import json
+import random
+import time
+import typing
+
+import session
+from instrument import LatencyHistogram
+
+
+"""
+Synthetic typist
+
+Drives a running FastTypeGame by injecting key events into its input field
+with event_generate, so the whole on_key_pressed -> update_ui path runs as it
+does for a person at the keyboard. The bot types the word on screen at a
+target WPM with typos (a wrong key, BackSpace, the right key) and optional
+bursts; in passage mode it types the passage from the cursor, separators
+included. It measures while it runs:
+
+    event_lag        key generated -> on_key_pressed saw it
+    frame_interval   time between refresh ticks while keys were arriving
+    update_ui        time spent in each refresh
+    dropped          whole frame budgets a key waited for a refresh
+    backlog          keys generated but not yet handled
+
+Keys are queued at the tail of the Tk event queue, so a slow handler shows up
+as lag and backlog rather than as a slower bot. The bot reads each next word
+from the screen once the keys of the previous one have been handled.
+
+Usage:
+    python typist.py --wpm 1200 --error-rate 0.03 --duration 60 --report stress.json
+"""
+
+# Most keys generated in one after() callback, so the bot can't starve the event loop
+MAX_BATCH = 64
+TYPO_CHARS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class SyntheticTypist:
+    """Types into a FastTypeGame and collects frame and event-queue measurements."""
+
+    def __init__(self, game: typing.Any, wpm: float = 120, error_rate: float = 0.02,
+                 burst_keys: int = 0, burst_speedup: float = 3, duration: float = 60,
+                 seed: int = 0, on_done: typing.Optional[typing.Callable[[typing.Dict[str, typing.Any]], None]] = None) -> None:
+        self.game = game
+        self.wpm = wpm
+        self.error_rate = error_rate
+        self.burst_keys = burst_keys
+        self.burst_speedup = burst_speedup
+        self.duration = duration
+        self.on_done = on_done
+        self.rng = random.Random(seed)
+        # Seconds per key at the target speed, five keys to a word
+        self.interval = 12 / wpm
+        self.plan: typing.Deque[str] = collections.deque()
+        self.in_flight: typing.Deque[int] = collections.deque()
+        self.keys_sent: int = 0
+        self.keys_handled: int = 0
+        self.max_backlog: int = 0
+        self.dropped_refreshes: int = 0
+        self.rounds: int = 0
+        self.event_lag = LatencyHistogram()
+        self.frame_interval = LatencyHistogram()
+        self.update_time = LatencyHistogram()
+        self.running: bool = False
+        self._started: float = 0
+        self._next_due: float = 0
+        self._burst_position: int = 0
+        self._last_tick_ns: int = 0
+        self._keys_since_tick: int = 0
+        self._first_key_ns: int = 0
+        self._refresh_callback = game.refresh.callback
+
+    def start(self) -> None:
+        game = self.game
+        # Tap the Entry's key binding so every injected key is seen as it is handled
+        game.input_field.bind("<Key>", self._on_key)
+        game.refresh.callback = self._timed_refresh
+        game.input_field.focus_force()
+        self.running = True
+        self._started = time.perf_counter()
+        self._next_due = self._started
+        game.window.after(0, self._pump)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self.game.input_field.bind("<Key>", self.game.on_key_pressed)
+        self.game.refresh.callback = self._refresh_callback
+        if self.on_done is not None:
+            self.on_done(self.report())
+
+    def plan_text(self, text: str) -> None:
+        for char in text:
+            if self.rng.random() < self.error_rate:
+                typo = self.rng.choice(TYPO_CHARS.replace(char, ""))
+                self.plan.append(typo)
+                self.plan.append("BackSpace")
+            self.plan.append(session.char_keysym(char))
+
+    def plan_word(self, word: str) -> None:
+        self.plan_text(word)
+        self.plan.append("Return")
+
+    def plan_passage(self, passage_session: session.PassageSession) -> None:
+        """Plan the passage from the cursor through the next word and the separator after it."""
+        text = passage_session.passage
+        start = end = passage_session.cursor
+        while end < len(text) and text[end].isspace():
+            end += 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        self.plan_text(text[start:end + 1])
+
+    def next_interval(self) -> float:
+        jitter = self.rng.uniform(0.8, 1.2)
+        if not self.burst_keys:
+            return self.interval * jitter
+        self._burst_position += 1
+        if self._burst_position < self.burst_keys:
+            return self.interval / self.burst_speedup * jitter
+        # A pause after each burst brings the average back to the target speed
+        self._burst_position = 0
+        return self.interval * (self.burst_keys - (self.burst_keys - 1) / self.burst_speedup) * jitter
+
+    def _pump(self) -> None:
+        if not self.running:
+            return
+        game = self.game
+        now = time.perf_counter()
+        if now - self._started >= self.duration:
+            self.stop()
+            return
+        typing_session = game.session
+        if typing_session.finished and not self.in_flight:
+            if not game.result_screen.visible or game.race is not None:
+                # Wait for the game over screen, or in a race for the server's next round
+                game.window.after(10, self._pump)
+                return
+            self.plan.clear()
+            self.rounds += 1
+            game.on_game_over_key("return")
+            self._next_due = time.perf_counter()
+            game.window.after(1, self._pump)
+            return
+        sent = 0
+        while self._next_due <= now and sent < MAX_BATCH:
+            if not self.plan:
+                if self.in_flight or typing_session.finished:
+                    break
+                if isinstance(typing_session, session.PassageSession):
+                    # The passage's own separators, not Return, end its words
+                    self.plan_passage(typing_session)
+                else:
+                    self.plan_word(typing_session.current_word)
+            keysym = self.plan.popleft()
+            generated_ns = time.perf_counter_ns()
+            self.in_flight.append(generated_ns)
+            game.input_field.event_generate("<KeyPress>", keysym=keysym, when="tail")
+            self.keys_sent += 1
+            if not self._keys_since_tick:
+                self._first_key_ns = generated_ns
+            self._keys_since_tick += 1
+            sent += 1
+            self._next_due += self.next_interval()
+        if len(self.in_flight) > self.max_backlog:
+            self.max_backlog = len(self.in_flight)
+        if self._next_due < now - 1:
+            # Too far behind to catch up (e.g. waiting on the game); don't fire a backlog at once
+            self._next_due = now
+        game.window.after(max(1, int((self._next_due - time.perf_counter()) * 1000)), self._pump)
+
+    def _on_key(self, event: typing.Any) -> typing.Optional[str]:
+        if self.in_flight:
+            self.event_lag.record(time.perf_counter_ns() - self.in_flight.popleft())
+            self.keys_handled += 1
+        return self.game.on_key_pressed(event)
+
+    def _timed_refresh(self) -> None:
+        started_ns = time.perf_counter_ns()
+        if self._keys_since_tick:
+            if self._last_tick_ns:
+                self.frame_interval.record(started_ns - self._last_tick_ns)
+            # Each whole frame budget the first waiting key sat through is a refresh that didn't happen
+            self.dropped_refreshes += (started_ns - self._first_key_ns) // int(self.game.refresh.frame_budget * 1e9)
+        self._last_tick_ns = started_ns
+        self._keys_since_tick = 0
+        self._refresh_callback()
+        self.update_time.record(time.perf_counter_ns() - started_ns)
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        elapsed = time.perf_counter() - self._started
+        return {
+            "target_wpm": self.wpm,
+            "achieved_wpm": self.keys_sent / 5 / elapsed * 60 if elapsed > 0 else 0,
+            "error_rate": self.error_rate,
+            "duration": elapsed,
+            "rounds": self.rounds,
+            "keys_sent": self.keys_sent,
+            "keys_handled": self.keys_handled,
+            "max_backlog": self.max_backlog,
+            "dropped_refreshes": self.dropped_refreshes,
+            "refresh": self.game.refresh.stats(),
+            "tk_calls": self.game.view.stats(),
+            "event_lag": self.event_lag.summary(),
+            "frame_interval": self.frame_interval.summary(),
+            "update_ui": self.update_time.summary(),
+        }
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Stress the game by typing into it with a synthetic typist.",
+                                     epilog="Any other options are passed on to main.py.")
+    parser.add_argument("--wpm", type=float, default=600, help="target typing speed")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="chance of a typo per character")
+    parser.add_argument("--burst", type=int, default=0, metavar="KEYS",
+                        help="type in bursts of KEYS keys followed by a pause (0 types steadily)")
+    parser.add_argument("--burst-speedup", type=float, default=3, help="how much faster than --wpm bursts are")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to type for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", metavar="FILE", help="write the measurements as JSON to FILE (default: stdout)")
+    args, game_argv = parser.parse_known_args(argv)
+
+    # Imported here so `python typist.py --help` doesn't need a display
+    import main as game_main
+
+    def write_report(report: typing.Dict[str, typing.Any]) -> None:
+        text = json.dumps(report, indent=2)
+        if args.report:
+            with open(args.report, "w") as f:
+                f.write(text)
+        else:
+            print(text)
+
+    def attach(game: typing.Any) -> None:
+        typist = SyntheticTypist(game, wpm=args.wpm, error_rate=args.error_rate, burst_keys=args.burst,
+                                 burst_speedup=args.burst_speedup, duration=args.duration, seed=args.seed,
+                                 on_done=lambda report: (write_report(report), game.quit_game()))
+        # Start once the window is up so the first frames aren't counted as dropped
+        game.window.after(200, typist.start)
+
+    game_main.run(game_main.parse_args(game_argv), on_ready=attach)
+
+
+if __name__ == "__main__":
+    main()
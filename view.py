@@ -0,0 +1,65 @@
+import typing
+
+
+"""
+Label view-model
+
+Every configure() on a Tk widget is a round-trip into Tcl, and most refresh
+ticks change nothing on screen (the timer moves once a second, the counters
+only on a key). LabelView remembers the last value each bound label was given
+and only configures the ones whose value actually changed, counting the Tk
+calls it makes per tick.
+"""
+
+_UNSET = object()
+
+
+class LabelView:
+    """Pushes values to bound labels, skipping the ones that haven't changed."""
+
+    def __init__(self) -> None:
+        self._labels: typing.Dict[str, typing.Tuple[typing.Any, str]] = {}
+        self._values: typing.Dict[str, typing.Any] = {}
+        # Tk calls made since the last end_tick, and totals over all ticks
+        self.calls: int = 0
+        self.last_tick_calls: int = 0
+        self.total_calls: int = 0
+        self.ticks: int = 0
+        self.idle_ticks: int = 0
+
+    def bind(self, name: str, widget: typing.Any, template: str = "{}") -> None:
+        """Show `name` on `widget` as `template.format(value)`."""
+        self._labels[name] = (widget, template)
+        self._values[name] = _UNSET
+
+    def set(self, name: str, value: typing.Any) -> bool:
+        """Show `value` on the label bound to `name`; returns whether Tk was called."""
+        if self._values[name] == value:
+            return False
+        self._values[name] = value
+        widget, template = self._labels[name]
+        widget.configure(text=template.format(value))
+        self.calls += 1
+        return True
+
+    def count(self, calls: int) -> None:
+        """Count Tk calls made for this tick by something other than set()."""
+        self.calls += calls
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "ticks": self.ticks,
+            "idle_ticks": self.idle_ticks,
+            "total_calls": self.total_calls,
+            "calls_per_tick": self.total_calls / self.ticks if self.ticks else 0,
+        }
+
+    def end_tick(self) -> int:
+        """Close the counts for one refresh tick and return its Tk call count."""
+        self.last_tick_calls = self.calls
+        self.total_calls += self.calls
+        self.ticks += 1
+        if not self.calls:
+            self.idle_ticks += 1
+        self.calls = 0
+        return self.last_tick_calls